@@ -0,0 +1,190 @@
+import os
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import argparse
+import random
+
+import pygame
+
+import shooter
+
+def fire_script(slot, frames, reload_every=60):
+    pos = (shooter.inventory.pos[0] + slot * 74 + 30, shooter.inventory.pos[1] + 20)
+    script = {0: [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos),
+                  pygame.event.Event(pygame.KEYDOWN, key=pygame.K_d)]}
+    for frame in range(reload_every, frames, reload_every):
+        script[frame] = [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=3, pos=pos)]
+    return script
+
+def spawn_slimes(count, radius, seed):
+    placement = random.Random(seed)
+    for _ in range(count):
+        x = shooter.player.x + placement.uniform(-radius, radius)
+        y = shooter.player.y + placement.uniform(-radius, radius)
+        shooter.slimes.spawn(x, y)
+
+def empty_chunk(seed, chunk_x, chunk_y):
+    return shooter.Chunk(chunk_x, chunk_y)
+
+def dense_chunk(seed, chunk_x, chunk_y):
+    chunk = shooter.generate_chunk(seed, chunk_x, chunk_y)
+    chunk.items = []
+    for cell_y in range(shooter.CHUNK_CELLS):
+        for cell_x in range(shooter.CHUNK_CELLS):
+            if not chunk.walls.get(cell_x, cell_y):
+                x = chunk_x * shooter.CHUNK_SIZE + cell_x * shooter.CELL_SIZE + shooter.CELL_SIZE // 2
+                y = chunk_y * shooter.CHUNK_SIZE + cell_y * shooter.CELL_SIZE + shooter.CELL_SIZE // 2
+                chunk.items.append(shooter.AmmoItem(x, y))
+    return chunk
+
+def empty_map(frames, seed):
+    shooter.MAX_SLIMES = 0
+    return shooter.ScriptedInput({})
+
+def slimes_100(frames, seed):
+    spawn_slimes(100, 1500, seed)
+    return shooter.ScriptedInput({})
+
+def slimes_1000(frames, seed):
+    spawn_slimes(1000, 3000, seed)
+    return shooter.ScriptedInput({})
+
+def ak47_fire(frames, seed):
+    spawn_slimes(100, 1500, seed)
+    return shooter.ScriptedInput(fire_script(1, frames))
+
+def ak47_swarm(frames, seed):
+    spawn_slimes(1000, 3000, seed)
+    return shooter.ScriptedInput(fire_script(1, frames))
+
+def dense_items(frames, seed):
+    return shooter.ScriptedInput({})
+
+class WallEdits(shooter.ScriptedInput):
+    # knocks a wall in or out near the player every few frames, so the changed chunk's ground,
+    # flow field and wall lookups are rebuilt while slimes path around it
+    def __init__(self, seed, every=10):
+        super().__init__({})
+        self.placement = random.Random(seed)
+        self.every = every
+
+    def generate(self, frame):
+        if frame % self.every == 0:
+            # never on the player's own column, so the idle player is not walled in
+            offset_x = self.placement.choice([-1, 1]) * self.placement.randint(2, 5)
+            cell_x = int(shooter.player.x // shooter.CELL_SIZE) + offset_x
+            cell_y = int(shooter.player.y // shooter.CELL_SIZE) + self.placement.randint(-5, 5)
+            shooter.world_map.set(cell_x, cell_y, 1 - shooter.world_map.cell(cell_x, cell_y))
+        return []
+
+def wall_edits(frames, seed):
+    spawn_slimes(100, 1500, seed)
+    return WallEdits(seed)
+
+SCENARIOS = {
+    "empty_map": empty_map,
+    "slimes_100": slimes_100,
+    "slimes_1000": slimes_1000,
+    "ak47_fire": ak47_fire,
+    "ak47_swarm": ak47_swarm,
+    "dense_items": dense_items,
+    "wall_edits": wall_edits,
+}
+
+# crowds the batched engine exists for; at a hundred slimes both engines are within noise of each other
+SLIME_SCENARIOS = ("slimes_1000", "ak47_swarm")
+
+GENERATORS = {
+    "empty_map": empty_chunk,
+    "dense_items": dense_chunk,
+}
+
+def percentile(sorted_times, fraction):
+    index = min(len(sorted_times) - 1, int(round(fraction * (len(sorted_times) - 1))))
+    return sorted_times[index]
+
+def run_scenario(name, frames, warmup, seed):
+    max_slimes = shooter.MAX_SLIMES
+    shooter.chunk_generator = GENERATORS.get(name, shooter.generate_chunk)
+    try:
+        shooter.reset(seed, simulated_clock=True)
+        shooter.player.health.invulnerable = True
+        input_driver = SCENARIOS[name](frames + warmup, seed)
+        frame_times = shooter.run(frames + warmup, input_driver, [])
+    finally:
+        shooter.MAX_SLIMES = max_slimes
+        shooter.chunk_generator = shooter.generate_chunk
+    return sorted(frame_times[warmup:])
+
+def check_batched(names, frames, warmup, seed):
+    slower = []
+    print(f"{'scenario':<14}{'objects':>9}{'batched':>9}  (mean ms)")
+    for name in names:
+        means = []
+        for batched in (False, True):
+            shooter.BATCHED_SLIMES = batched
+            times = run_scenario(name, frames, warmup, seed)
+            means.append(sum(times) / len(times) / 1e6)
+        print(f"{name:<14}{means[0]:>9.3f}{means[1]:>9.3f}")
+        if means[1] >= means[0]:
+            slower.append(name)
+    return slower
+
+def run_replay(recording, warmup):
+    input_driver = shooter.start_replay(recording, simulated_clock=True)
+    frame_times = shooter.run(len(recording["steps"]), input_driver, [])
+    return sorted(frame_times[warmup:])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmarks")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"scenarios to run, any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batched", action="store_true", help="simulate slimes with the NumPy engine")
+    parser.add_argument("--workers", type=int, default=0, help="split slime AI across this many worker processes")
+    parser.add_argument("--no-lod", action="store_true", help="update every slime on every tick")
+    parser.add_argument("--dirty-rects", action="store_true", help="present frames with dirty-rectangle updates")
+    parser.add_argument("--replay", action="append", default=[], metavar="PATH",
+                        help="also time a recorded session (repeatable); these replace the default scenario list")
+    parser.add_argument("--check-batched", action="store_true",
+                        help=f"time scenarios (default: {', '.join(SLIME_SCENARIOS)}) with both slime engines "
+                             "and fail unless the batched one is faster")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    if args.check_batched and (args.batched or args.replay):
+        parser.error("--check-batched picks the engine itself and cannot be combined with --batched or --replay")
+
+    shooter.BATCHED_SLIMES = args.batched
+    shooter.SLIME_WORKERS = args.workers
+    shooter.SLIME_LOD = not args.no_lod
+    shooter.DIRTY_RECTS = args.dirty_rects
+    if args.check_batched:
+        slower = check_batched(args.scenarios or SLIME_SCENARIOS, args.frames, args.warmup, args.seed)
+        shooter.slimes.close()
+        pygame.quit()
+        if slower:
+            parser.exit(1, f"batched engine is not faster on: {', '.join(slower)}\n")
+        return
+
+    recordings = [(os.path.splitext(os.path.basename(path))[0], shooter.load_recording(path)) for path in args.replay]
+    runs = [(name, lambda name=name: run_scenario(name, args.frames, args.warmup, args.seed))
+            for name in args.scenarios or ([] if recordings else SCENARIOS)]
+    runs += [(name, lambda recording=recording: run_replay(recording, args.warmup)) for name, recording in recordings]
+    print(f"{'scenario':<14}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, measure in runs:
+        times = measure()
+        mean = sum(times) / len(times) / 1e6
+        p50, p90, p99 = (percentile(times, f) / 1e6 for f in (0.5, 0.9, 0.99))
+        print(f"{name:<14}{mean:>9.3f}{p50:>9.3f}{p90:>9.3f}{p99:>9.3f}{times[-1] / 1e6:>9.3f}")
+    shooter.slimes.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
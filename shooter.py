@@ -1,88 +1,991 @@
 import pygame
+import argparse
+import asyncio
+import csv
+import gc
+import itertools
+import json
 import os
 import random
 import math
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.forkserver
+import queue
+import signal
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
+from multiprocessing import shared_memory
 
-pygame.init()
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# slime workers import this module again, as the main script or from it, and must not open a window
+WORKER_PROCESS = (multiprocessing.current_process().name != "MainProcess"
+                  or sys.modules["__main__"].__name__ == "__mp_main__")
+WORKER_START = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def option_given(option):
+    # checked before main() parses the command line, so accept what argparse does: any prefix longer
+    # than "--", with or without an attached "=value"; an ambiguous one fails in main() anyway
+    names = (arg.split("=", 1)[0] for arg in sys.argv[1:] if arg.startswith("--"))
+    return any(len(name) > 2 and option.startswith(name) for name in names)
+
+if option_given("--headless") or option_given("--serve") or WORKER_PROCESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+if WORKER_START == "forkserver" and not WORKER_PROCESS and option_given("--workers"):
+    # start the server workers fork from while this process has neither SDL nor any thread
+    multiprocessing.forkserver.ensure_running()
+
+if not WORKER_PROCESS:
+    pygame.init()
 
 WIDTH = 1200
 HEIGHT = 800
 CELL_SIZE = 100
 CHUNK_SIZE = 10 * CELL_SIZE
+CHUNK_CELLS = CHUNK_SIZE // CELL_SIZE
+STREAM_RADIUS = 2
+EVICT_RADIUS = 4
+MISSING_CHUNK = 2
+FLOW_MARGIN = 5
+# cells a flow field search may expand per tick once there is a field to fall back on
+FLOW_BUDGET = 800
+ASSET_CACHE_DIR = ".asset_cache"
+ATLAS_VERSION = 1
+ATLAS_WIDTH = 1024
 MAX_SLIMES = 100
-SPAWN_INTERVAL = 2000
-DAMAGE_INTERVAL = 1000
-
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("test nazar jak proekt")
+BASE_SPAWN_INTERVAL = 2000
+BASE_DAMAGE_INTERVAL = 1000
+SPAWN_INTERVAL = BASE_SPAWN_INTERVAL
+DAMAGE_INTERVAL = BASE_DAMAGE_INTERVAL
+SPAWN_ATTEMPTS = 5
+# (ms since the start, spawn interval cut, damage interval cut)
+DIFFICULTY_STEPS = ((5000, 500, 0), (20000, 500, 100), (30000, 500, 300), (60000, 450, 400))
+GAME_OVER_DELAY = 5000
+WHEEL_SLOTS = 256
+GROUND_CACHE_CHUNKS = 12
+MAX_BULLETS = 512
+BATCHED_SLIMES = False
+SLIME_WORKERS = 0
+SLIME_LOD = True
+LOD_INTERVAL = 4
+LOD_MARGIN = 200
+TEXT_CACHE_SIZE = 256
+TICK_RATE = 60
+RENDER_FPS = 60
+MAX_CATCHUP_STEPS = 5
+DIRTY_RECTS = False
+MAX_DIRTY_RECTS = 256
+PROFILE_PHASES = ("events", "spawn", "movement", "world", "tiles", "items", "bullets", "slimes", "blits", "hud", "flip")
+PROFILE_WINDOW = 120
+PROFILE_REFRESH = 15
+PROFILE_CSV = None
+SAVE_PATH = None
+SAVE_VERSION = 1
+INVENTORY_SLOTS = 5
+SNAPSHOT_HISTORY = 64
+SNAPSHOT_BACKLOG = 256 * 1024
+LAYER_GROUND, LAYER_ITEMS, LAYER_BULLETS, LAYER_SLIMES, LAYER_PLAYER = range(5)
+TRACKED_LAYERS = (LAYER_BULLETS, LAYER_SLIMES, LAYER_PLAYER)
+
+screen = None
+if not WORKER_PROCESS:
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("test nazar jak proekt")
+
+rng = random.Random()
+# entities are keyed on the wire by ids that are never reused, unlike list slots and recycled objects
+entity_ids = itertools.count(1)
+
+fonts = {}
+text_cache = OrderedDict()
+icon_cache = {}
+
+def get_font(size):
+    font = fonts.get(size)
+    if font is None:
+        font = fonts[size] = pygame.font.Font(None, size)
+    return font
+
+def render_text(text, size, color):
+    key = (text, size, color)
+    surface = text_cache.get(key)
+    if surface is not None:
+        text_cache.move_to_end(key)
+        return surface
+    surface = text_cache[key] = get_font(size).render(text, True, color)
+    while len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return surface
+
+def scaled_icon(texture, size):
+    key = (texture, size)
+    icon = icon_cache.get(key)
+    if icon is None:
+        icon = icon_cache[key] = pygame.transform.scale(texture, size)
+    return icon
+
+def ms_to_ticks(ms):
+    return max(1, -(-int(ms) * TICK_RATE // 1000))
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+def lod_view(player_x, player_y):
+    # slimes are scheduled from the simulated player position rather than the interpolated camera,
+    # so which ones update on a tick never depends on frame timing
+    left = player_x - WIDTH // 2 - LOD_MARGIN
+    top = player_y - HEIGHT // 2 - LOD_MARGIN
+    return left, top, left + WIDTH + 2 * LOD_MARGIN, top + HEIGHT + 2 * LOD_MARGIN
 
 def draw_message_box(screen, lines, x, y, width, height):
     pygame.draw.rect(screen, (50, 50, 50), (x, y, width, height))
     pygame.draw.rect(screen, (200, 200, 200), (x, y, width, height), 3)
-    font = pygame.font.Font(None, 36)
+    font = get_font(36)
     total_height = len(lines) * font.get_height()
     current_y = y + (height - total_height) // 2
     for line in lines:
-        text_surface = font.render(line, True, (255, 255, 255))
+        text_surface = render_text(line, 36, (255, 255, 255))
         text_rect = text_surface.get_rect(center=(x + width // 2, current_y))
         screen.blit(text_surface, text_rect)
         current_y += font.get_height()
 
-def is_wall(x, y, width, height):
-    x = int(x)
-    y = int(y)
-    left = x // CELL_SIZE
-    right = (x + width) // CELL_SIZE
-    top = y // CELL_SIZE
-    bottom = (y + height) // CELL_SIZE
-
-    for cell_y in range(int(top), int(bottom) + 1):
-        for cell_x in range(int(left), int(right) + 1):
-            grid_x = cell_x * CELL_SIZE
+class TileGrid:
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.cells = bytearray(cols * rows)
+        self.array = None
+        if np is not None:
+            self.array = np.frombuffer(self.cells, dtype=np.uint8).reshape(rows, cols)
+
+    def get(self, cell_x, cell_y):
+        if 0 <= cell_x < self.cols and 0 <= cell_y < self.rows:
+            return self.cells[cell_y * self.cols + cell_x]
+        return 0
+
+    def set(self, cell_x, cell_y, value):
+        self.cells[cell_y * self.cols + cell_x] = value
+
+class Chunk:
+    def __init__(self, chunk_x, chunk_y):
+        self.x = chunk_x
+        self.y = chunk_y
+        self.walls = TileGrid(CHUNK_CELLS, CHUNK_CELLS)
+        self.decorations = {}
+        self.items = []
+
+    def contains(self, x, y):
+        return int(x // CHUNK_SIZE) == self.x and int(y // CHUNK_SIZE) == self.y
+
+class ChunkedWorld:
+    def __init__(self, seed, generator, threaded=False):
+        self.seed = seed
+        self.generator = generator
+        self.chunks = {}
+        self.active = set()
+        self.pending = set()
+        self.center = None
+        self.centers = ()
+        self.revision = 0
+        self.modified = set()
+        # edited chunks that streamed out of range, as encode_chunk records; the rest regenerate from the seed
+        self.stored = {}
+        # flow fields laid over this world, each told when walls under it change
+        self.flows = []
+        self.windows = {}
+        self.requests = None
+        self.results = None
+        if threaded:
+            self.requests = queue.Queue()
+            self.results = queue.Queue()
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def work(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            self.results.put(self.generator(self.seed, *key))
+
+    def close(self):
+        if self.requests is not None:
+            self.requests.put(None)
+
+    def install(self, chunk):
+        key = (chunk.x, chunk.y)
+        self.pending.discard(key)
+        # a synchronous require() may have generated the chunk before the worker delivered it
+        if key not in self.chunks:
+            record = self.stored.pop(key, None)
+            if record is not None:
+                # edited and evicted while the worker was regenerating it from the seed
+                chunk = decode_chunk(record, 0)
+            self.chunks[key] = chunk
+            self.revision += 1
+            for flow in self.flows:
+                flow.invalidate(chunk.x * CHUNK_CELLS, chunk.y * CHUNK_CELLS, CHUNK_CELLS)
+        return self.chunks[key]
+
+    def require(self, chunk_x, chunk_y):
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            record = self.stored.pop((chunk_x, chunk_y), None)
+            if record is not None:
+                chunk = self.install(decode_chunk(record, 0))
+            else:
+                chunk = self.install(self.generator(self.seed, chunk_x, chunk_y))
+        return chunk
+
+    def near(self, chunk_x, chunk_y, radius):
+        return any(abs(chunk_x - center_x) <= radius and abs(chunk_y - center_y) <= radius
+                   for center_x, center_y in self.centers)
+
+    def activate(self, chunk):
+        key = (chunk.x, chunk.y)
+        if key not in self.active:
+            self.active.add(key)
+            for item in chunk.items:
+                items_on_ground.add(item)
+            chunk.items = []
+
+    def freeze(self, chunk):
+        chunk.items = self.chunk_items(chunk)
+        self.active.discard((chunk.x, chunk.y))
+        for item in chunk.items:
+            items_on_ground.remove(item)
+
+    def evict(self, key):
+        chunk = self.chunks.pop(key)
+        if key in self.active:
+            self.freeze(chunk)
+        if key in self.modified:
+            self.stored[key] = encode_chunk(chunk, chunk.items)
+        self.revision += 1
+
+    def saved_chunks(self):
+        for key in sorted(self.modified):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                yield chunk, self.chunk_items(chunk)
+            elif key in self.stored:
+                chunk = decode_chunk(self.stored[key], 0)
+                yield chunk, chunk.items
+
+    def update(self, x, y):
+        self.follow([(x, y)])
+
+    def follow(self, points):
+        # a shared server world streams around every player; the first point is the primary center
+        if self.results is not None:
+            while True:
+                try:
+                    chunk = self.install(self.results.get_nowait())
+                except queue.Empty:
+                    break
+                if self.near(chunk.x, chunk.y, STREAM_RADIUS):
+                    self.activate(chunk)
+
+        centers = tuple((int(x // CHUNK_SIZE), int(y // CHUNK_SIZE)) for x, y in points)
+        if centers == self.centers:
+            return
+        self.centers = centers
+        self.center = centers[0]
+        self.windows = {center: window for center, window in self.windows.items() if center in centers}
+
+        for center in centers:
+            ring = [(center[0] + dx, center[1] + dy)
+                    for dx in range(-STREAM_RADIUS, STREAM_RADIUS + 1)
+                    for dy in range(-STREAM_RADIUS, STREAM_RADIUS + 1)]
+            ring.sort(key=lambda key: max(abs(key[0] - center[0]), abs(key[1] - center[1])))
+            for chunk_x, chunk_y in ring:
+                if ((chunk_x, chunk_y) in self.chunks or (chunk_x, chunk_y) in self.stored
+                        or self.requests is None or self.near(chunk_x, chunk_y, 1)):
+                    self.activate(self.require(chunk_x, chunk_y))
+                elif (chunk_x, chunk_y) not in self.pending:
+                    self.pending.add((chunk_x, chunk_y))
+                    self.requests.put((chunk_x, chunk_y))
+
+        # memory follows the streaming radius rather than the distance travelled
+        for key in list(self.chunks):
+            if not self.near(key[0], key[1], EVICT_RADIUS):
+                self.evict(key)
+
+    def touch(self, x, y):
+        self.modified.add((int(x // CHUNK_SIZE), int(y // CHUNK_SIZE)))
+
+    def chunk_items(self, chunk):
+        if (chunk.x, chunk.y) not in self.active:
+            return chunk.items
+        area = pygame.Rect(chunk.x * CHUNK_SIZE, chunk.y * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        return [item for item in items_on_ground.query(area) if chunk.contains(item.x, item.y)]
+
+    def bounds(self):
+        left = (min(center_x for center_x, center_y in self.centers) - STREAM_RADIUS) * CHUNK_SIZE
+        top = (min(center_y for center_x, center_y in self.centers) - STREAM_RADIUS) * CHUNK_SIZE
+        right = (max(center_x for center_x, center_y in self.centers) + STREAM_RADIUS + 1) * CHUNK_SIZE
+        bottom = (max(center_y for center_x, center_y in self.centers) + STREAM_RADIUS + 1) * CHUNK_SIZE
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def cell(self, cell_x, cell_y):
+        chunk = self.chunks.get((cell_x // CHUNK_CELLS, cell_y // CHUNK_CELLS))
+        if chunk is None:
+            return MISSING_CHUNK
+        return chunk.walls.get(cell_x % CHUNK_CELLS, cell_y % CHUNK_CELLS)
+
+    def set(self, cell_x, cell_y, value):
+        chunk = self.require(cell_x // CHUNK_CELLS, cell_y // CHUNK_CELLS)
+        chunk.walls.set(cell_x % CHUNK_CELLS, cell_y % CHUNK_CELLS, value)
+        self.revision += 1
+        self.modified.add((chunk.x, chunk.y))
+        ground.invalidate(cell_x * CELL_SIZE, cell_y * CELL_SIZE)
+        for flow in self.flows:
+            flow.invalidate(cell_x, cell_y)
+        dirty_rects.invalidate()
+
+    def region(self, left, top, cols, rows):
+        values = bytearray([MISSING_CHUNK]) * (cols * rows)
+        for chunk_y in range(top // CHUNK_CELLS, (top + rows - 1) // CHUNK_CELLS + 1):
+            for chunk_x in range(left // CHUNK_CELLS, (left + cols - 1) // CHUNK_CELLS + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    continue
+                first_x = max(left, chunk_x * CHUNK_CELLS)
+                last_x = min(left + cols, (chunk_x + 1) * CHUNK_CELLS)
+                for cell_y in range(max(top, chunk_y * CHUNK_CELLS), min(top + rows, (chunk_y + 1) * CHUNK_CELLS)):
+                    start = (cell_y % CHUNK_CELLS) * CHUNK_CELLS + first_x % CHUNK_CELLS
+                    offset = (cell_y - top) * cols + first_x - left
+                    values[offset:offset + last_x - first_x] = chunk.walls.cells[start:start + last_x - first_x]
+        return values
+
+    def cover(self, center):
+        # wall lookups index a dense copy of the cells each streaming center can have loaded, one per center
+        # so players far apart never share a window spanning the ground between them; it is rebuilt
+        # from whole chunks once a chunk or cell has changed
+        window = self.windows.get(center)
+        if window is None or window.revision != self.revision:
+            size = (2 * EVICT_RADIUS + 1) * CHUNK_CELLS
+            window = TileGrid(size, size)
+            window.left = (center[0] - EVICT_RADIUS) * CHUNK_CELLS
+            window.top = (center[1] - EVICT_RADIUS) * CHUNK_CELLS
+            window.cells[:] = self.region(window.left, window.top, size, size)
+            window.revision = self.revision
+            if np is not None:
+                window.walls = WallWindow(window.array)
+                window.walls.left = window.left
+                window.walls.top = window.top
+            self.windows[center] = window
+        return window
+
+    def is_wall(self, x, y, width, height):
+        x = int(x)
+        y = int(y)
+        left = x // CELL_SIZE
+        right = (x + width) // CELL_SIZE
+        top = y // CELL_SIZE
+        bottom = (y + height) // CELL_SIZE
+
+        for center in self.centers:
+            window = self.cover(center)
+            if (window.left <= left and window.top <= top
+                    and right < window.left + window.cols and bottom < window.top + window.rows):
+                cells, cols, origin_left, origin_top = window.cells, window.cols, window.left, window.top
+                break
+        else:
+            # straddling two windows or outside every one: copy just the box's cells out of their chunks
+            cols = right - left + 1
+            cells, origin_left, origin_top = self.region(left, top, cols, bottom - top + 1), left, top
+        for cell_y in range(top, bottom + 1):
             grid_y = cell_y * CELL_SIZE
-            if world_map.get((grid_x, grid_y), 0) == 1:
-                wall_zone = grid_y + CELL_SIZE * 0.3
-                if y + height > grid_y and y < wall_zone:
+            wall_zone = grid_y + CELL_SIZE * 0.3
+            in_zone = y + height > grid_y and y < wall_zone
+            row = (cell_y - origin_top) * cols - origin_left
+            for cell_x in range(left, right + 1):
+                value = cells[row + cell_x]
+                if value == MISSING_CHUNK or (value == 1 and in_zone):
                     return True
-    return False
+        return False
 
-@dataclass
+    def is_wall_batch(self, x, y, width, height):
+        hits = np.zeros(len(x), dtype=np.bool_)
+        if len(x) == 0:
+            return hits
+        cell_x = np.trunc(x).astype(np.int64)
+        cell_y = np.trunc(y).astype(np.int64)
+        left = cell_x // CELL_SIZE
+        top = cell_y // CELL_SIZE
+        right = (cell_x + width) // CELL_SIZE
+        bottom = (cell_y + height) // CELL_SIZE
+        for center in self.centers:
+            window = self.cover(center)
+            if (window.left <= left.min() and window.top <= top.min()
+                    and right.max() < window.left + window.cols and bottom.max() < window.top + window.rows):
+                return window.walls.is_wall_batch(x, y, width, height)
+        # spread over several windows: each box goes to the first one holding it whole, the rest take the scalar path
+        rest = np.ones(len(x), dtype=np.bool_)
+        for center in self.centers:
+            if not rest.any():
+                break
+            window = self.cover(center)
+            inside = rest & (left >= window.left) & (top >= window.top)
+            inside &= (right < window.left + window.cols) & (bottom < window.top + window.rows)
+            if inside.any():
+                hits[inside] = window.walls.is_wall_batch(x[inside], y[inside], width, height)
+                rest &= ~inside
+        for index in np.flatnonzero(rest).tolist():
+            hits[index] = self.is_wall(x[index], y[index], width, height)
+        return hits
+
+def is_wall(x, y, width, height):
+    return world_map.is_wall(x, y, width, height)
+
+class FlowField:
+    # opposite directions sit at mirrored indices, so the way back along offset k is 7 - k
+    OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+    GOAL = 8
+    NO_PATH = 255
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.size = 2 * radius + 1
+        self.stride = self.size + 2
+        self.goal = None
+        self.left = 0
+        self.top = 0
+        self.dirty = True
+        self.flow = bytearray([self.NO_PATH]) * (self.stride * self.stride)
+        self.scratch = bytearray(len(self.flow))
+        self.search = None
+        self.codes = None
+        if np is not None:
+            self.codes = np.frombuffer(self.flow, dtype=np.uint8)
+            self.offset_x = np.array([dx for dx, dy in self.OFFSETS] + [0], dtype=np.int64)
+            self.offset_y = np.array([dy for dx, dy in self.OFFSETS] + [0], dtype=np.int64)
+
+    def invalidate(self, cell_x, cell_y, cells=1):
+        # a search under way has already read its walls, so any change means another one after it
+        if self.search is not None or (cell_x < self.left + self.size and cell_x + cells > self.left
+                                       and cell_y < self.top + self.size and cell_y + cells > self.top):
+            self.dirty = True
+
+    def update(self, x, y):
+        if self.search is None:
+            goal = (int(x // CELL_SIZE), int(y // CELL_SIZE))
+            if goal == self.goal and not self.dirty:
+                return
+            self.dirty = False
+            self.search = self.build(goal)
+        # slimes follow the previous field until the new one is complete, only the first is built at once
+        budget = FLOW_BUDGET if self.goal is not None else math.inf
+        for expanded in self.search:
+            budget -= expanded
+            if budget <= 0:
+                return
+        self.search = None
+
+    def build(self, goal):
+        # breadth-first search outward from the player's cell over a padded window of the wall grid;
+        # each reached cell stores the direction of the neighbour one step closer to the player.
+        # yields the size of every ring it expands and swaps the result in when it runs out
+        left = goal[0] - self.radius
+        top = goal[1] - self.radius
+        stride = self.stride
+        cells = world_map.region(left - 1, top - 1, stride, stride)
+        cells[:stride] = cells[-stride:] = bytes([1]) * stride
+        cells[::stride] = cells[stride - 1::stride] = bytes([1]) * stride
+        flow = self.scratch
+        flow[:] = bytes([self.NO_PATH]) * len(flow)
+
+        steps = [(code, dy * stride + dx, dx, dy * stride) for code, (dx, dy) in enumerate(self.OFFSETS)]
+        start = (self.radius + 1) * stride + self.radius + 1
+        flow[start] = self.GOAL
+        frontier = [start]
+        while frontier:
+            reached = []
+            for i in frontier:
+                for code, offset, side_x, side_y in steps:
+                    j = i + offset
+                    if flow[j] != self.NO_PATH or cells[j]:
+                        continue
+                    # diagonal steps may not cut the corner of a wall
+                    if side_x and side_y and (cells[i + side_x] or cells[i + side_y]):
+                        continue
+                    flow[j] = 7 - code
+                    reached.append(j)
+            yield len(frontier)
+            frontier = reached
+        # copied rather than rebound, the NumPy view and the worker's shared copy read this buffer
+        self.flow[:] = flow
+        self.goal = goal
+        self.left = left
+        self.top = top
+
+    def target(self, x, y):
+        cell_x = int(x // CELL_SIZE)
+        cell_y = int(y // CELL_SIZE)
+        col = cell_x - self.left
+        row = cell_y - self.top
+        if not (0 <= col < self.size and 0 <= row < self.size):
+            return None
+        code = self.flow[(row + 1) * self.stride + col + 1]
+        if code >= self.GOAL:
+            return None
+        dx, dy = self.OFFSETS[code]
+        return (cell_x + dx) * CELL_SIZE + CELL_SIZE / 2, (cell_y + dy) * CELL_SIZE + CELL_SIZE / 2
+
+    def targets(self, x, y):
+        cell_x = np.floor_divide(x, CELL_SIZE).astype(np.int64)
+        cell_y = np.floor_divide(y, CELL_SIZE).astype(np.int64)
+        col = cell_x - self.left
+        row = cell_y - self.top
+        inside = (col >= 0) & (col < self.size) & (row >= 0) & (row < self.size)
+        codes = self.codes.take((row + 1) * self.stride + col + 1, mode="clip")
+        guided = inside & (codes < self.GOAL)
+        codes = np.where(guided, codes, self.GOAL)
+        target_x = (cell_x + self.offset_x[codes]) * CELL_SIZE + CELL_SIZE / 2
+        target_y = (cell_y + self.offset_y[codes]) * CELL_SIZE + CELL_SIZE / 2
+        return guided, target_x, target_y
+
+class DirtyRects:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.rects = []
+        self.previous = []
+        self.full = True
+        self.camera_pos = None
+
+    def add(self, rect):
+        if self.enabled and rect:
+            self.rects.append(rect)
+
+    def extend(self, rects):
+        if self.enabled:
+            self.rects.extend(rect for rect in rects if rect)
+
+    def invalidate(self):
+        self.full = True
+
+    def present(self, camera):
+        camera_pos = (camera.x, camera.y)
+        rects = self.previous + self.rects
+        if not self.enabled or self.full or camera_pos != self.camera_pos or len(rects) > MAX_DIRTY_RECTS:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+        self.camera_pos = camera_pos
+        self.previous = self.rects
+        self.rects = []
+        self.full = False
+
+class RenderQueue:
+    def __init__(self, layers):
+        self.layers = [[] for _ in range(layers)]
+
+    def add(self, layer, surface, pos):
+        self.layers[layer].append((surface, pos))
+
+    def extend(self, layer, commands):
+        self.layers[layer].extend(commands)
+
+    def flush(self, screen):
+        # one blits() call per layer keeps the per-sprite work in C; layers still paint back to front
+        for layer, commands in enumerate(self.layers):
+            if commands:
+                tracked = dirty_rects.enabled and layer in TRACKED_LAYERS
+                rects = screen.blits(commands, doreturn=tracked)
+                if tracked:
+                    dirty_rects.extend(rects)
+                commands.clear()
+
+class GameClock:
+    def __init__(self, tick_rate, render_fps, simulated=False):
+        self.tick_rate = tick_rate
+        self.render_fps = render_fps
+        self.simulated = simulated
+        self.step_ms = 1000 / tick_rate
+        self.ticks = 0
+        self.accumulator = 0.0
+        self.clock = pygame.time.Clock()
+        self.script = None
+        self.steps = 0
+
+    def tick(self):
+        if self.simulated:
+            dt = self.step_ms
+        else:
+            dt = self.clock.tick(self.render_fps)
+        if self.script is not None:
+            # replays run the recorded number of ticks per frame, whatever the frame actually took
+            self.steps = next(self.script, 0)
+            return self.steps
+        self.accumulator += dt
+        steps = int(self.accumulator // self.step_ms)
+        if steps > MAX_CATCHUP_STEPS:
+            # too far behind to catch up: drop the backlog instead of spiralling
+            steps = MAX_CATCHUP_STEPS
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step_ms
+        self.steps = steps
+        return steps
+
+    def advance(self):
+        self.ticks += 1
+
+    def alpha(self):
+        return self.accumulator / self.step_ms
+
+    def get_ticks(self):
+        return self.ticks * 1000 // self.tick_rate
+
+class TimerWheel:
+    def __init__(self, slots, now=0):
+        self.slots = [[] for _ in range(slots)]
+        self.now = now
+
+    def schedule(self, delay, callback, *args):
+        # timers always land on a later tick, and ones further out than a revolution wait in their slot
+        timer = [self.now + max(1, delay), callback, args]
+        self.slots[timer[0] % len(self.slots)].append(timer)
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None:
+            timer[1] = None
+
+    def advance(self, now):
+        self.now = now
+        slot = self.slots[now % len(self.slots)]
+        if not slot:
+            return
+        due = [timer for timer in slot if timer[0] <= now]
+        slot[:] = [timer for timer in slot if timer[0] > now]
+        for _, callback, args in due:
+            if callback is not None:
+                callback(*args)
+
+class KeyState:
+    def __init__(self, held=()):
+        self.held = set(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+class LiveInput:
+    def events(self):
+        return pygame.event.get()
+
+    def pressed(self):
+        return pygame.key.get_pressed()
+
+class ScriptedInput:
+    def __init__(self, script):
+        self.script = script
+        self.frame = 0
+        self.keys = KeyState()
+
+    def generate(self, frame):
+        return self.script.get(frame, [])
+
+    def events(self):
+        pygame.event.pump()
+        events = self.generate(self.frame)
+        self.frame += 1
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                self.keys.held.add(event.key)
+            elif event.type == pygame.KEYUP:
+                self.keys.held.discard(event.key)
+        return events
+
+    def pressed(self):
+        return self.keys
+
+class RandomInput(ScriptedInput):
+    MOVE_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+
+    def __init__(self, seed=None):
+        super().__init__({})
+        self.rng = random.Random(seed)
+
+    def generate(self, frame):
+        events = []
+        if frame == 0 or self.rng.random() < 0.02:
+            slot = self.rng.randrange(2)
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(74 * slot + 80, 60)))
+        if self.rng.random() < 0.05:
+            for key in self.keys.held:
+                events.append(pygame.event.Event(pygame.KEYUP, key=key))
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=self.rng.choice(self.MOVE_KEYS)))
+        if self.rng.random() < 0.01:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=(0, 0)))
+        if self.rng.random() < 0.01:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=3, pos=(0, 0)))
+        if self.rng.random() < 0.005:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_f))
+        return events
+
+RECORDED_EVENTS = {
+    pygame.KEYDOWN: ("key",),
+    pygame.KEYUP: ("key",),
+    pygame.MOUSEBUTTONDOWN: ("button", "pos"),
+    pygame.MOUSEBUTTONUP: ("button", "pos"),
+    pygame.QUIT: (),
+}
+RECORDED_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+RECORDING_VERSION = 3
+
+class RecordingInput:
+    def __init__(self, source, seed):
+        self.source = source
+        self.seed = seed
+        self.frame = 0
+        self.steps = []
+        self.log = {}
+        self.key_changes = {}
+        self.held = None
+
+    def events(self):
+        events = self.source.events()
+        self.steps.append(game_clock.steps)
+        recorded = [[pygame.event.event_name(event.type), {name: getattr(event, name) for name in RECORDED_EVENTS[event.type]}]
+                    for event in events if event.type in RECORDED_EVENTS]
+        if recorded:
+            self.log[self.frame] = recorded
+        # movement is polled rather than driven by events, so keep the held keys whenever they change
+        pressed = self.source.pressed()
+        held = [key for key in RECORDED_KEYS if pressed[key]]
+        if held != self.held:
+            self.held = held
+            self.key_changes[self.frame] = held
+        self.frame += 1
+        return events
+
+    def pressed(self):
+        return self.source.pressed()
+
+    def save(self, path):
+        recording = {
+            "version": RECORDING_VERSION,
+            "seed": self.seed,
+            "batched": BATCHED_SLIMES,
+            "workers": SLIME_WORKERS,
+            "lod": SLIME_LOD,
+            "tick_rate": TICK_RATE,
+            "steps": "".join(map(str, self.steps)),
+            "keys": self.key_changes,
+            "events": self.log,
+        }
+        with open(path, "w") as file:
+            json.dump(recording, file, separators=(",", ":"))
+
+class ReplayInput(ScriptedInput):
+    EVENT_TYPES = {pygame.event.event_name(event_type): event_type for event_type in RECORDED_EVENTS}
+
+    def __init__(self, recording):
+        super().__init__({int(frame): [self.decode(*event) for event in events]
+                          for frame, events in recording["events"].items()})
+        self.key_changes = {int(frame): keys for frame, keys in recording["keys"].items()}
+
+    def decode(self, name, attributes):
+        if "pos" in attributes:
+            attributes["pos"] = tuple(attributes["pos"])
+        return pygame.event.Event(self.EVENT_TYPES[name], **attributes)
+
+    def events(self):
+        pygame.event.pump()
+        if self.frame in self.key_changes:
+            self.keys = KeyState(self.key_changes[self.frame])
+        events = self.generate(self.frame)
+        self.frame += 1
+        return events
+
+def load_recording(path):
+    with open(path) as file:
+        recording = json.load(file)
+    if recording.get("version") != RECORDING_VERSION:
+        raise ValueError(f"{path} is not a version {RECORDING_VERSION} recording")
+    if recording["tick_rate"] != TICK_RATE:
+        raise ValueError(f"{path} was recorded at {recording['tick_rate']} Hz, the game ticks at {TICK_RATE} Hz")
+    return recording
+
+def start_replay(recording, simulated_clock=False):
+    global BATCHED_SLIMES, SLIME_WORKERS, SLIME_LOD
+
+    BATCHED_SLIMES = recording["batched"]
+    SLIME_WORKERS = recording["workers"]
+    SLIME_LOD = recording["lod"]
+    reset(recording["seed"], simulated_clock, threaded_world=False)
+    game_clock.script = iter(int(steps) for steps in recording["steps"])
+    return ReplayInput(recording)
+
+@dataclass(slots=True)
 class HealthSystem:
     max_hearts: int
     current_hearts: int
-    last_damage_time: int = 0
+    invulnerable: bool = False
+    recovery: list = None
 
     def take_damage(self, amount):
-        if pygame.time.get_ticks() - self.last_damage_time > DAMAGE_INTERVAL:
-            self.current_hearts = max(0, self.current_hearts - amount)
-            self.last_damage_time = pygame.time.get_ticks()
+        if self.invulnerable or self.recovery is not None:
+            return
+        self.current_hearts = max(0, self.current_hearts - amount)
+        self.recovery = timers.schedule(ms_to_ticks(DAMAGE_INTERVAL), self.recover)
+
+    def recover(self):
+        self.recovery = None
+
+    def refill(self):
+        timers.cancel(self.recovery)
+        self.recovery = None
+        self.current_hearts = self.max_hearts
 
 class Camera:
-    def __init__(self, map_size):
+    def __init__(self):
         self.x = 0
         self.y = 0
         self.width = WIDTH
         self.height = HEIGHT
-        self.map_width, self.map_height = map_size
 
     def apply(self, pos):
         return (pos[0] - self.x, pos[1] - self.y)
 
-    def update(self, target):
-        self.x = target.x + target.width // 2 - self.width // 2
-        self.y = target.y + target.height // 2 - self.height // 2
-        self.x = max(0, min(self.x, self.map_width - self.width))
-        self.y = max(0, min(self.y, self.map_height - self.height))
+    def update(self, target, alpha=1.0):
+        x = lerp(target.prev_x, target.x, alpha)
+        y = lerp(target.prev_y, target.y, alpha)
+        self.x = x + target.width // 2 - self.width // 2
+        self.y = y + target.height // 2 - self.height // 2
+
+class GroundCache:
+    def __init__(self, max_chunks):
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+
+    def render_chunk(self, chunk):
+        surface = pygame.Surface((CHUNK_SIZE, CHUNK_SIZE)).convert()
+        origin_x = chunk.x * CHUNK_SIZE
+        origin_y = chunk.y * CHUNK_SIZE
+        for cell_y in range(CHUNK_CELLS):
+            for cell_x in range(CHUNK_CELLS):
+                x = cell_x * CELL_SIZE
+                y = cell_y * CELL_SIZE
+                texture = 'grass2' if chunk.walls.get(cell_x, cell_y) else 'grass1'
+                surface.blit(textures[texture], (x, y))
+
+                decor_type = chunk.decorations.get((origin_x + x, origin_y + y))
+                if decor_type:
+                    pos = (x + CELL_SIZE // 2 - 15, y + CELL_SIZE - 40)
+                    surface.blit(textures[decor_type], pos)
+        return surface
+
+    def get(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        surface = self.chunks.get(key)
+        if surface is not None:
+            self.chunks.move_to_end(key)
+            return surface
+        chunk = world_map.chunks.get(key)
+        if chunk is None:
+            return None
+        surface = self.render_chunk(chunk)
+        self.chunks[key] = surface
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def invalidate(self, x, y):
+        self.chunks.pop((int(x) // CHUNK_SIZE, int(y) // CHUNK_SIZE), None)
+
+    def draw(self, queue, camera):
+        first_x = int(camera.x // CHUNK_SIZE)
+        first_y = int(camera.y // CHUNK_SIZE)
+        last_x = int((camera.x + camera.width) // CHUNK_SIZE)
+        last_y = int((camera.y + camera.height) // CHUNK_SIZE)
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                surface = self.get(chunk_x, chunk_y)
+                if surface is not None:
+                    queue.add(LAYER_GROUND, surface, camera.apply((chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE)))
+
+class SpatialHash:
+    def __init__(self, bucket_size):
+        self.bucket_size = bucket_size
+        self.items = []
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def key(self, obj):
+        return (int(obj.x) // self.bucket_size, int(obj.y) // self.bucket_size)
+
+    def add(self, obj):
+        obj.index = len(self.items)
+        self.items.append(obj)
+        obj.bucket = self.key(obj)
+        self.buckets.setdefault(obj.bucket, {})[obj] = None
+
+    def remove(self, obj):
+        last = self.items.pop()
+        if last is not obj:
+            self.items[obj.index] = last
+            last.index = obj.index
+        bucket = self.buckets[obj.bucket]
+        del bucket[obj]
+        if not bucket:
+            del self.buckets[obj.bucket]
+
+    def update(self, obj):
+        key = self.key(obj)
+        if key == obj.bucket:
+            return
+        bucket = self.buckets[obj.bucket]
+        del bucket[obj]
+        if not bucket:
+            del self.buckets[obj.bucket]
+        obj.bucket = key
+        self.buckets.setdefault(key, {})[obj] = None
+
+    def query(self, rect):
+        # objects are keyed by their top-left corner and are never larger than a bucket,
+        # so one extra bucket up and to the left covers everything that can overlap
+        found = []
+        left = (rect.left - self.bucket_size) // self.bucket_size
+        right = rect.right // self.bucket_size
+        top = (rect.top - self.bucket_size) // self.bucket_size
+        bottom = rect.bottom // self.bucket_size
+        for bucket_y in range(top, bottom + 1):
+            for bucket_x in range(left, right + 1):
+                bucket = self.buckets.get((bucket_x, bucket_y))
+                if not bucket:
+                    continue
+                for obj in bucket:
+                    if rect.colliderect(pygame.Rect(obj.x, obj.y, obj.width, obj.height)):
+                        found.append(obj)
+        return found
 
 class Player:
-    def __init__(self, map_size):
+    def __init__(self):
         self.width = 60
         self.height = 80
         self.speed = 5
-        self.map_width, self.map_height = map_size
         self.x = (10 * 10 * CELL_SIZE) // 2 - self.width // 2
         self.y = (10 * 10 * CELL_SIZE) // 2 - self.height // 2
+        self.prev_x = self.x
+        self.prev_y = self.y
         self.health = HealthSystem(5, 5)
 
 @dataclass
@@ -102,34 +1005,133 @@ class Weapon:
         self.texture = texture
         self.max_ammo = config.ammo_capacity * 5
         self.current_ammo = config.ammo_capacity
-        self.last_shot = 0
+        self.ready = True
 
-    def can_shoot(self):
-        now = pygame.time.get_ticks()
-        return (now - self.last_shot) > 1000 / self.config.fire_rate
+    def rearm(self):
+        self.ready = True
 
     def shoot(self):
-        if self.current_ammo > 0 and self.can_shoot():
+        if self.current_ammo > 0 and self.ready:
             self.current_ammo -= 1
-            self.last_shot = pygame.time.get_ticks()
+            self.ready = False
+            timers.schedule(ms_to_ticks(1000 / self.config.fire_rate), self.rearm)
             return True
         return False
 
     def add_ammo(self, amount):
         self.current_ammo = min(self.current_ammo + amount, self.max_ammo)
 
-class Bullet:
-    def __init__(self, x, y, direction, config):
-        self.x = x
-        self.y = y
-        self.direction = direction
-        self.speed = config.bullet_speed
-        self.radius = config.bullet_size
-        self.color = config.bullet_color
-        self.damage = config.damage
-        self.spread = random.uniform(-config.spread, config.spread)
+class BulletPool:
+    DIRECTIONS = {"right": (1, 0), "left": (-1, 0), "up": (0, -1), "down": (0, 1)}
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        if np is not None:
+            self.x = np.zeros(capacity)
+            self.y = np.zeros(capacity)
+            self.vx = np.zeros(capacity)
+            self.vy = np.zeros(capacity)
+        else:
+            self.x = [0.0] * capacity
+            self.y = [0.0] * capacity
+            self.vx = [0.0] * capacity
+            self.vy = [0.0] * capacity
+        self.configs = [None] * capacity
+        self.sprites = {}
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y, direction, config):
+        if self.count == self.capacity:
+            return False
+        spread = math.radians(rng.uniform(-config.spread, config.spread))
+        step_x, step_y = self.DIRECTIONS[direction]
+        speed = config.bullet_speed
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = step_x * speed + math.cos(spread) * speed * 0.1
+        self.vy[i] = step_y * speed + math.sin(spread) * speed * 0.1
+        self.configs[i] = config
+        self.count += 1
+        return True
+
+    def integrate(self):
+        n = self.count
+        if np is not None:
+            self.x[:n] += self.vx[:n]
+            self.y[:n] += self.vy[:n]
+        else:
+            for i in range(n):
+                self.x[i] += self.vx[i]
+                self.y[i] += self.vy[i]
+
+    def compact(self, alive):
+        n = self.count
+        if np is not None:
+            keep = np.flatnonzero(alive)
+            kept = len(keep)
+            for array in (self.x, self.y, self.vx, self.vy):
+                array[:kept] = array[:n][keep]
+        else:
+            keep = [i for i in range(n) if alive[i]]
+            kept = len(keep)
+            for array in (self.x, self.y, self.vx, self.vy):
+                array[:kept] = [array[i] for i in keep]
+        self.configs[:kept] = [self.configs[i] for i in keep]
+        self.configs[kept:n] = [None] * (n - kept)
+        self.count = kept
+
+    def step(self, slimes, bounds):
+        self.integrate()
+        n = self.count
+        if np is not None:
+            x = self.x[:n]
+            y = self.y[:n]
+            alive = (x >= bounds.left) & (x <= bounds.right) & (y >= bounds.top) & (y <= bounds.bottom)
+        else:
+            alive = [bounds.left <= self.x[i] <= bounds.right and bounds.top <= self.y[i] <= bounds.bottom
+                     for i in range(n)]
+
+        killed = 0
+        for i in slimes.struck(self.x[:n], self.y[:n], [config.bullet_size for config in self.configs[:n]]):
+            config = self.configs[i]
+            radius = config.bullet_size
+            rect = pygame.Rect(self.x[i] - radius, self.y[i] - radius, radius * 2, radius * 2)
+            hit, dead = slimes.hit(rect, config.damage)
+            if hit:
+                alive[i] = False
+                killed += dead
+        self.compact(alive)
+        return killed
+
+    def sprite(self, config):
+        sprite = self.sprites.get(config.name)
+        if sprite is None:
+            radius = config.bullet_size
+            sprite = self.sprites[config.name] = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, config.bullet_color, (radius, radius), radius)
+            sprite.set_alpha(255, pygame.RLEACCEL)
+        return sprite
+
+    def visible(self, rect):
+        return [(int(self.x[i]), int(self.y[i]), self.configs[i]) for i in range(self.count)
+                if rect.left <= self.x[i] < rect.right and rect.top <= self.y[i] < rect.bottom]
+
+    def draw(self, queue, camera, alpha=1.0):
+        behind = 1.0 - alpha
+        for i in range(self.count):
+            config = self.configs[i]
+            radius = config.bullet_size
+            x = int(self.x[i] - self.vx[i] * behind) - radius
+            y = int(self.y[i] - self.vy[i] * behind) - radius
+            queue.add(LAYER_BULLETS, self.sprite(config), camera.apply((x, y)))
 
 class Item:
+    __slots__ = ("x", "y", "texture", "width", "height", "original", "net_id", "index", "bucket")
+
     def __init__(self, x, y, texture, original=None):
         self.x = x
         self.y = y
@@ -137,15 +1139,18 @@ class Item:
         self.width = 30
         self.height = 30
         self.original = original
+        self.net_id = next(entity_ids)
 
 class AmmoItem(Item):
+    __slots__ = ("amount",)
+
     def __init__(self, x, y):
         super().__init__(x, y, textures['ammo'])
         self.amount = 10
 
 class Inventory:
     def __init__(self):
-        self.slots = [None] * 5
+        self.slots = [None] * INVENTORY_SLOTS
         self.selected = -1
         self.pos = (50, 30)
         self.slot_size = 50
@@ -170,55 +1175,198 @@ class Inventory:
             return removed_item
         return None
 
-    def draw(self, screen):
-        pygame.draw.rect(screen, (40, 40, 40), (self.pos[0] - 20, self.pos[1] - 20, 330, 90))
+    def draw(self, screen, offset=(0, 0)):
+        pygame.draw.rect(screen, (40, 40, 40), (self.pos[0] - 20 - offset[0], self.pos[1] - 20 - offset[1], 330, 90))
         for i in range(5):
-            x = self.pos[0] + i * (self.slot_size + 10)
-            y = self.pos[1]
+            x = self.pos[0] + i * (self.slot_size + 10) - offset[0]
+            y = self.pos[1] - offset[1]
             color = (200, 200, 0) if i == self.selected else (100, 100, 100)
             pygame.draw.rect(screen, color, (x, y, self.slot_size, self.slot_size), 3)
             if self.slots[i]:
                 item = self.slots[i]
                 if isinstance(item, Weapon):
-                    screen.blit(pygame.transform.scale(item.texture, (40, 40)), (x + 5, y + 5))
-                    font = pygame.font.Font(None, 18)
-                    text = font.render(str(item.current_ammo), True, (255, 255, 255))
+                    screen.blit(scaled_icon(item.texture, (40, 40)), (x + 5, y + 5))
+                    text = render_text(str(item.current_ammo), 18, (255, 255, 255))
                     screen.blit(text, (x + 35, y + 35))
                 else:
-                    screen.blit(pygame.transform.scale(item.texture, (30, 30)), (x + 10, y + 10))
+                    screen.blit(scaled_icon(item.texture, (30, 30)), (x + 10, y + 10))
+
+class Hud:
+    def __init__(self, inventory, health):
+        self.inventory = inventory
+        self.health = health
+        self.panel_pos = (inventory.pos[0] - 20, inventory.pos[1] - 20)
+        self.panel = pygame.Surface((330, 90)).convert()
+        self.hearts = pygame.Surface((10 + health.max_hearts * 35, 40), pygame.SRCALPHA)
+        self.overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 128))
+        self.panel_state = None
+        self.hearts_state = None
+
+    def inventory_state(self):
+        return (self.inventory.selected,
+                tuple((slot, slot.current_ammo if isinstance(slot, Weapon) else None) for slot in self.inventory.slots))
+
+    def draw(self, screen):
+        state = self.inventory_state()
+        if state != self.panel_state:
+            self.panel_state = state
+            self.inventory.draw(self.panel, self.panel_pos)
+            dirty_rects.add(self.panel.get_rect(topleft=self.panel_pos))
+
+        if self.health.current_hearts != self.hearts_state:
+            self.hearts_state = self.health.current_hearts
+            self.hearts.fill((0, 0, 0, 0))
+            for i in range(self.health.current_hearts):
+                # hearts never overlap, so copy the pixels instead of blending onto the transparent strip
+                self.hearts.blit(textures['heart'], (10 + i * 35, 10), special_flags=pygame.BLEND_RGBA_MAX)
+            dirty_rects.add(self.hearts.get_rect())
+
+        screen.blit(self.panel, self.panel_pos)
+        screen.blit(self.hearts, (0, 0))
+
+    def draw_overlay(self, screen):
+        screen.blit(self.overlay, (0, 0))
+
+class FrameProfiler:
+    def __init__(self, csv_path=None):
+        self.samples = {phase: deque(maxlen=PROFILE_WINDOW) for phase in PROFILE_PHASES}
+        self.current = dict.fromkeys(PROFILE_PHASES, 0)
+        self.last = 0
+        self.frame = 0
+        self.visible = False
+        self.surface = None
+        self.pos = (0, 0)
+        self.csv_file = None
+        self.writer = None
+        if csv_path:
+            self.csv_file = open(csv_path, "w", newline="")
+            self.writer = csv.writer(self.csv_file)
+            self.writer.writerow(["frame", *PROFILE_PHASES, "total", "slime_count", "bullet_count", "item_count"])
+
+    def begin(self):
+        for phase in self.current:
+            self.current[phase] = 0
+        self.last = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end(self, slime_count, bullet_count, item_count):
+        self.frame += 1
+        for phase, elapsed in self.current.items():
+            self.samples[phase].append(elapsed)
+        if self.writer is not None:
+            timings = [self.current[phase] for phase in PROFILE_PHASES]
+            self.writer.writerow([self.frame, *timings, sum(timings), slime_count, bullet_count, item_count])
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.surface = None
+        dirty_rects.invalidate()
+
+    def summary(self, times):
+        if not times:
+            return "-", "-"
+        times = sorted(times)
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        return f"{sum(times) / len(times) / 1e6:.2f}", f"{p99 / 1e6:.2f}"
+
+    def render(self):
+        font = get_font(22)
+        line_height = font.get_linesize()
+        rows = [("phase", "avg ms", "p99 ms")]
+        for phase in PROFILE_PHASES:
+            # overlay text changes every refresh, so render it directly instead of churning the text cache
+            rows.append((phase, *self.summary(self.samples[phase])))
+        rows.append(("total", *self.summary([sum(frame) for frame in zip(*self.samples.values())])))
+
+        self.surface = pygame.Surface((250, 10 + len(rows) * line_height)).convert()
+        self.surface.fill((20, 20, 20))
+        for row, columns in enumerate(rows):
+            for column, text in zip((10, 100, 170), columns):
+                self.surface.blit(font.render(text, True, (220, 220, 220)), (column, 5 + row * line_height))
+        self.pos = (WIDTH - self.surface.get_width() - 10, 10)
+        dirty_rects.add(self.surface.get_rect(topleft=self.pos))
+
+    def draw(self, screen):
+        if not self.visible:
+            return
+        if self.surface is None or self.frame % PROFILE_REFRESH == 0:
+            self.render()
+        screen.blit(self.surface, self.pos)
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.writer = None
 
 class Slime:
-    ANIMATIONS = {'up': [], 'down': [], 'left': [], 'right': []}
+    ANIMATIONS = None
     ANIMATION_SPEED = 15
     DETECTION_RADIUS = 3 * CHUNK_SIZE
+    # composited sprites start at the leftmost heart, above and left of the slime itself
+    SPRITE_OFFSET = (15, 30)
+    SPRITES = {}
+    __slots__ = ("x", "y", "prev_x", "prev_y", "speed", "direction", "move_counter", "anim_counter", "anim_frame",
+                 "width", "height", "health", "is_chasing", "updated", "net_id", "index", "bucket")
 
     @classmethod
     def load_textures(cls):
-        directions = ['up', 'down', 'left', 'right']
-        for direction in directions:
-            cls.ANIMATIONS[direction] = [
-                pygame.transform.scale(
-                    pygame.image.load(f"slime/{direction}/slime{i}.png").convert_alpha(),
-                    (60, 80))
-                for i in range(1, 5)
-            ]
+        cls.ANIMATIONS = Animations(SpriteAtlas("slime", alpha=True), "slime/{direction}/slime{frame}.png", (60, 80))
+        cls.SPRITES = {}
+
+    @classmethod
+    def sprite(cls, direction, frame, hearts):
+        key = (direction, frame, hearts)
+        sprite = cls.SPRITES.get(key)
+        if sprite is None:
+            body = cls.ANIMATIONS[direction][frame]
+            heart = textures['heart']
+            offset_x, offset_y = cls.SPRITE_OFFSET
+            width = max(offset_x + body.get_width(), (hearts - 1) * 20 + heart.get_width())
+            sprite = cls.SPRITES[key] = pygame.Surface((width, offset_y + body.get_height()), pygame.SRCALPHA)
+            sprite.blit(body, cls.SPRITE_OFFSET)
+            for i in range(hearts):
+                sprite.blit(heart, (i * 20, 0))
+            # cached sprites never change, so let SDL run-length encode them and skip transparent spans
+            sprite.set_alpha(255, pygame.RLEACCEL)
+        return sprite
 
     def __init__(self, x, y):
+        self.speed = 2
+        self.width = 60
+        self.height = 80
+        self.health = HealthSystem(3, 3)
+        self.place(x, y)
+
+    def place(self, x, y):
         self.x = x
         self.y = y
-        self.speed = 2
-        self.direction = random.choice(["up", "down", "left", "right"])
+        self.prev_x = x
+        self.prev_y = y
+        self.direction = rng.choice(["up", "down", "left", "right"])
         self.move_counter = 0
         self.anim_counter = 0
         self.anim_frame = 0
-        self.width = 60
-        self.height = 80
-        self.health = HealthSystem(3, 3)
+        self.health.refill()
         self.is_chasing = False
-
-    def move(self, player_x, player_y):
-        self.move_counter += 1
-        self.anim_counter += 1
+        self.updated = game_clock.ticks - 1
+        self.net_id = next(entity_ids)
+
+    def move(self, player_x, player_y, now, flow):
+        self.prev_x, self.prev_y = self.x, self.y
+        ticks = now - self.updated
+        self.updated = now
+        moved = self.move_counter
+        animated = self.anim_counter
+        self.move_counter += ticks
+        self.anim_counter += ticks
+        # a slime waking from dormancy catches its timers up but only covers one off-screen stride
+        strides = min(ticks, LOD_INTERVAL)
 
         dx = player_x - self.x
         dy = player_y - self.y
@@ -227,17 +1375,27 @@ class Slime:
         if distance < self.DETECTION_RADIUS:
             self.is_chasing = True
             if distance > 50:
+                target = flow.target(self.x + self.width / 2, self.y + self.height / 2)
+                if target is not None:
+                    dx = target[0] - self.width / 2 - self.x
+                    dy = target[1] - self.height / 2 - self.y
                 norm = math.hypot(dx, dy) or 1
-                move_x = dx / norm * self.speed
-                move_y = dy / norm * self.speed
+                move_x = dx / norm * self.speed * strides
+                move_y = dy / norm * self.speed * strides
 
                 prev_x, prev_y = self.x, self.y
                 self.x += move_x
                 self.y += move_y
 
                 if is_wall(self.x, self.y, self.width, self.height):
-                    self.x, self.y = prev_x, prev_y
-                    self.direction = random.choice(["up", "down", "left", "right"])
+                    # slide along whichever axis is still free before giving up
+                    if not is_wall(prev_x + move_x, prev_y, self.width, self.height):
+                        self.x, self.y = prev_x + move_x, prev_y
+                    elif not is_wall(prev_x, prev_y + move_y, self.width, self.height):
+                        self.x, self.y = prev_x, prev_y + move_y
+                    else:
+                        self.x, self.y = prev_x, prev_y
+                        self.direction = rng.choice(["up", "down", "left", "right"])
                 else:
                     if abs(move_x) > abs(move_y):
                         self.direction = "right" if move_x > 0 else "left"
@@ -245,10 +1403,10 @@ class Slime:
                         self.direction = "down" if move_y > 0 else "up"
         else:
             self.is_chasing = False
-            if self.move_counter % 100 == 0:
-                self.direction = random.choice(["up", "down", "left", "right"])
+            if self.move_counter // 100 != moved // 100:
+                self.direction = rng.choice(["up", "down", "left", "right"])
 
-            if self.move_counter % 5 == 0:
+            if self.move_counter // 5 != moved // 5:
                 prev_x, prev_y = self.x, self.y
                 if self.direction == "up":
                     self.y -= self.speed
@@ -261,28 +1419,667 @@ class Slime:
 
                 if is_wall(self.x, self.y, self.width, self.height):
                     self.x, self.y = prev_x, prev_y
-                    self.direction = random.choice(["up", "down", "left", "right"])
-
-        if self.anim_counter % self.ANIMATION_SPEED == 0:
-            self.anim_frame = (self.anim_frame + 1) % 4
-
-    def draw(self, screen, camera):
-        screen.blit(self.ANIMATIONS[self.direction][self.anim_frame], camera.apply((self.x, self.y)))
-        for i in range(self.health.current_hearts):
-            heart_pos = camera.apply((self.x + i * 20 - 15, self.y - 30))
-            screen.blit(textures['heart'], heart_pos)
-
-textures = {
-    'grass1': pygame.transform.scale(pygame.image.load("texture/land/grass1.png").convert(), (CELL_SIZE, CELL_SIZE)),
-    'grass2': pygame.transform.scale(pygame.image.load("texture/land/grass2.png").convert(), (CELL_SIZE, CELL_SIZE)),
-    'flower': pygame.transform.scale(pygame.image.load("texture/decor/flower.png").convert_alpha(), (40, 30)),
-    'rock': pygame.transform.scale(pygame.image.load("texture/decor/rock.png").convert_alpha(), (50, 50)),
-    'pistol': pygame.transform.scale(pygame.image.load("texture/weapons/pistol.png").convert_alpha(), (80, 60)),
-    'ak47': pygame.transform.scale(pygame.image.load("texture/weapons/ak-47.png").convert_alpha(), (100, 50)),
-    'red_orb': pygame.transform.scale(pygame.image.load("texture/items/red_orb.png").convert_alpha(), (30, 30)),
-    'heart': pygame.transform.scale(pygame.image.load("texture/items/heart.png").convert_alpha(), (30, 30)),
-    'ammo': pygame.transform.scale(pygame.image.load("texture/items/ammo.png").convert_alpha(), (30, 30))
-}
+                    self.direction = rng.choice(["up", "down", "left", "right"])
+
+        frames = self.anim_counter // self.ANIMATION_SPEED - animated // self.ANIMATION_SPEED
+        self.anim_frame = (self.anim_frame + frames) % 4
+
+        slimes.update(self)
+
+    def draw(self, queue, camera, alpha=1.0):
+        x, y = camera.apply((lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)))
+        sprite = self.sprite(self.direction, self.anim_frame, self.health.current_hearts)
+        queue.add(LAYER_SLIMES, sprite, (int(x) - self.SPRITE_OFFSET[0], int(y) - self.SPRITE_OFFSET[1]))
+
+class SlimeSwarm(SpatialHash):
+    def __init__(self, bucket_size):
+        super().__init__(bucket_size)
+        # killed slimes are recycled by later spawns so steady play stops allocating them
+        self.free = []
+
+    def spawn(self, x, y):
+        if self.free:
+            slime = self.free.pop()
+            slime.place(x, y)
+        else:
+            slime = Slime(x, y)
+        self.add(slime)
+        return slime
+
+    def remove(self, slime):
+        super().remove(slime)
+        self.free.append(slime)
+
+    def restore(self, x, y, hearts, direction):
+        slime = self.spawn(x, y)
+        slime.health.current_hearts = hearts
+        slime.direction = BatchedSlimes.DIRECTIONS[direction]
+
+    def records(self):
+        return [(slime.x, slime.y, slime.health.current_hearts, BatchedSlimes.DIRECTIONS.index(slime.direction))
+                for slime in self.items]
+
+    def close(self):
+        pass
+
+    def nearest(self, points):
+        groups = [[] for _ in points]
+        for slime in self.items:
+            distances = [(slime.x - x) ** 2 + (slime.y - y) ** 2 for x, y in points]
+            groups[distances.index(min(distances))].append(slime)
+        return groups
+
+    def visible(self, rect):
+        return [(slime.net_id, (int(slime.x), int(slime.y), BatchedSlimes.DIRECTIONS.index(slime.direction),
+                               slime.anim_frame, slime.health.current_hearts))
+                for slime in self.query(rect)]
+
+    def step(self, player_x, player_y, flow, members=None):
+        now = game_clock.ticks
+        members = self.items if members is None else members
+        if not SLIME_LOD:
+            for slime in members:
+                slime.move(player_x, player_y, now, flow)
+            return
+        left, top, right, bottom = lod_view(player_x, player_y)
+        radius = Slime.DETECTION_RADIUS
+        for slime in members:
+            # on screen every tick, off-screen chasers every LOD_INTERVAL ticks staggered by slot,
+            # far wanderers not until the player comes back within range
+            if left <= slime.x <= right and top <= slime.y <= bottom:
+                slime.move(player_x, player_y, now, flow)
+            elif ((now + slime.index) % LOD_INTERVAL == 0
+                  and abs(slime.x - player_x) < radius and abs(slime.y - player_y) < radius):
+                slime.move(player_x, player_y, now, flow)
+
+    def draw(self, queue, camera, alpha=1.0):
+        # the margin keeps the heart row above a slime drawn while the body is just off screen
+        view = pygame.Rect(camera.x, camera.y, camera.width, camera.height).inflate(2 * LOD_MARGIN, 2 * LOD_MARGIN)
+        for slime in self.query(view):
+            slime.draw(queue, camera, alpha)
+
+    def struck(self, x, y, radius):
+        # the spatial hash already keeps every hit() local
+        return range(len(radius))
+
+    def touching(self, rect):
+        return bool(self.query(rect))
+
+    def hit(self, rect, damage):
+        found = self.query(rect)
+        if not found:
+            return False, False
+        slime = found[0]
+        slime.health.take_damage(damage)
+        if slime.health.current_hearts <= 0:
+            self.remove(slime)
+            return True, True
+        return True, False
+
+class BatchedSlimes:
+    DIRECTIONS = ("up", "down", "left", "right")
+    FIELDS = (("x", "f8"), ("y", "f8"), ("prev_x", "f8"), ("prev_y", "f8"), ("direction", "i1"),
+              ("move_counter", "i8"), ("anim_counter", "i8"), ("anim_frame", "i1"), ("hearts", "i2"),
+              ("recover_tick", "i8"), ("chasing", "?"), ("updated", "i8"), ("net_id", "i8"))
+
+    def __init__(self, capacity=256, rng=None):
+        self.rng = rng or np.random.default_rng()
+        self.count = 0
+        self.width = 60
+        self.height = 80
+        self.speed = 2
+        self.max_hearts = 3
+        self.step_x = np.array([0, 0, -1, 1], dtype=np.float64)
+        self.step_y = np.array([-1, 1, 0, 0], dtype=np.float64)
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        for name, dtype in self.FIELDS:
+            resized = np.zeros(capacity, dtype=dtype)
+            array = getattr(self, name, None)
+            if array is not None:
+                resized[:self.count] = array[:self.count]
+            setattr(self, name, resized)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y):
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.direction[i] = self.rng.integers(4)
+        self.move_counter[i] = 0
+        self.anim_counter[i] = 0
+        self.anim_frame[i] = 0
+        self.hearts[i] = self.max_hearts
+        self.recover_tick[i] = 0
+        self.chasing[i] = False
+        self.updated[i] = game_clock.ticks - 1
+        self.net_id[i] = next(entity_ids)
+        self.count += 1
+
+    def restore(self, x, y, hearts, direction):
+        self.spawn(x, y)
+        self.hearts[self.count - 1] = hearts
+        self.direction[self.count - 1] = direction
+
+    def records(self):
+        n = self.count
+        return zip(self.x[:n].tolist(), self.y[:n].tolist(), self.hearts[:n].tolist(), self.direction[:n].tolist())
+
+    def remove(self, i):
+        last = self.count - 1
+        if i != last:
+            for name, dtype in self.FIELDS:
+                array = getattr(self, name)
+                array[i] = array[last]
+        self.count = last
+
+    def close(self):
+        pass
+
+    def schedule(self, player_x, player_y, members=None):
+        n = self.count
+        if not SLIME_LOD:
+            return slice(0, n) if members is None else np.flatnonzero(members)
+        x = self.x[:n]
+        y = self.y[:n]
+        left, top, right, bottom = lod_view(player_x, player_y)
+        radius = Slime.DETECTION_RADIUS
+        visible = (x >= left) & (x <= right) & (y >= top) & (y <= bottom)
+        near = (np.abs(x - player_x) < radius) & (np.abs(y - player_y) < radius)
+        due = near & ((game_clock.ticks + np.arange(n)) % LOD_INTERVAL == 0)
+        if members is not None:
+            return np.flatnonzero((visible | due) & members)
+        return np.flatnonzero(visible | due)
+
+    def nearest(self, points):
+        n = self.count
+        x = np.array([point[0] for point in points])
+        y = np.array([point[1] for point in points])
+        closest = np.argmin((self.x[:n, None] - x) ** 2 + (self.y[:n, None] - y) ** 2, axis=1)
+        return [closest == k for k in range(len(points))]
+
+    def visible(self, rect):
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        index = np.flatnonzero((x + self.width > rect.left) & (x < rect.right)
+                               & (y + self.height > rect.top) & (y < rect.bottom))
+        return list(zip(self.net_id[index].tolist(),
+                        zip(self.x[index].astype(np.int64).tolist(), self.y[index].astype(np.int64).tolist(),
+                            self.direction[index].tolist(), self.anim_frame[index].tolist(),
+                            self.hearts[index].tolist())))
+
+    def step(self, player_x, player_y, flow, members=None):
+        if self.count:
+            index = self.schedule(player_x, player_y, members)
+            # nothing is due while the player has outrun every slime
+            if isinstance(index, slice) or index.size:
+                self.advance(index, player_x, player_y, world_map, flow, game_clock.ticks)
+
+    def advance(self, index, player_x, player_y, walls, flow, now):
+        x = self.x[index]
+        y = self.y[index]
+        self.prev_x[index] = x
+        self.prev_y[index] = y
+        direction = self.direction[index]
+        ticks = now - self.updated[index]
+        self.updated[index] = now
+        strides = np.minimum(ticks, LOD_INTERVAL)
+        moved = self.move_counter[index]
+        move_counter = moved + ticks
+        self.move_counter[index] = move_counter
+        animated = self.anim_counter[index]
+        anim_counter = animated + ticks
+        self.anim_counter[index] = anim_counter
+
+        dx = player_x - x
+        dy = player_y - y
+        distance = np.hypot(dx, dy)
+        chasing = distance < Slime.DETECTION_RADIUS
+        self.chasing[index] = chasing
+        approaching = chasing & (distance > 50)
+        guided, target_x, target_y = flow.targets(x + self.width / 2, y + self.height / 2)
+        guided &= approaching
+        dx = np.where(guided, target_x - self.width / 2 - x, dx)
+        dy = np.where(guided, target_y - self.height / 2 - y, dy)
+        norm = np.hypot(dx, dy)
+        norm[norm == 0] = 1
+        move_x = np.where(approaching, dx / norm * self.speed * strides, 0.0)
+        move_y = np.where(approaching, dy / norm * self.speed * strides, 0.0)
+
+        wandering = ~chasing
+        turning = wandering & (move_counter // 100 != moved // 100)
+        turns = int(turning.sum())
+        if turns:
+            direction[turning] = self.rng.integers(4, size=turns)
+        stepping = wandering & (move_counter // 5 != moved // 5)
+        move_x = np.where(stepping, self.step_x[direction] * self.speed, move_x)
+        move_y = np.where(stepping, self.step_y[direction] * self.speed, move_y)
+
+        moving = approaching | stepping
+        new_x = x + move_x
+        new_y = y + move_y
+        # the target boxes and the slides along each axis a blocked chaser would fall back to, in one query
+        chasers = np.flatnonzero(approaching)
+        hits = walls.is_wall_batch(np.concatenate((new_x, new_x[chasers], x[chasers])),
+                                   np.concatenate((new_y, y[chasers], new_y[chasers])), self.width, self.height)
+        count = len(new_x)
+        blocked = moving & hits[:count]
+        stuck = blocked[chasers]
+        sliding = chasers[stuck]
+        if sliding.size:
+            free_x = ~hits[count:count + chasers.size][stuck]
+            free_y = ~free_x & ~hits[count + chasers.size:][stuck]
+            new_y[sliding[free_x]] = y[sliding[free_x]]
+            new_x[sliding[free_y]] = x[sliding[free_y]]
+            blocked[sliding[free_x | free_y]] = False
+        moved = moving & ~blocked
+        x[moved] = new_x[moved]
+        y[moved] = new_y[moved]
+        self.x[index] = x
+        self.y[index] = y
+        bounces = int(blocked.sum())
+        if bounces:
+            direction[blocked] = self.rng.integers(4, size=bounces)
+
+        steered = approaching & ~blocked
+        horizontal = np.abs(move_x) > np.abs(move_y)
+        facing = np.where(horizontal, np.where(move_x > 0, 3, 2), np.where(move_y > 0, 1, 0))
+        direction[steered] = facing[steered]
+        self.direction[index] = direction
+
+        frames = anim_counter // Slime.ANIMATION_SPEED - animated // Slime.ANIMATION_SPEED
+        self.anim_frame[index] = (self.anim_frame[index] + frames) % 4
+
+    def draw(self, queue, camera, alpha=1.0):
+        n = self.count
+        xs = self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha
+        ys = self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha
+        visible = np.flatnonzero((xs > camera.x - LOD_MARGIN) & (xs < camera.x + camera.width + LOD_MARGIN)
+                                 & (ys > camera.y - LOD_MARGIN) & (ys < camera.y + camera.height + LOD_MARGIN))
+        # truncate the slime's own position first so the body lands on the same pixel as an unbatched blit
+        screen_x = (np.trunc(xs[visible] - camera.x).astype(np.int64) - Slime.SPRITE_OFFSET[0]).tolist()
+        screen_y = (np.trunc(ys[visible] - camera.y).astype(np.int64) - Slime.SPRITE_OFFSET[1]).tolist()
+        directions = [self.DIRECTIONS[direction] for direction in self.direction[visible].tolist()]
+        queue.extend(LAYER_SLIMES, [(Slime.sprite(direction, frame, hearts), (x, y)) for direction, frame, hearts, x, y
+                                    in zip(directions, self.anim_frame[visible].tolist(), self.hearts[visible].tolist(),
+                                           screen_x, screen_y)])
+
+    def colliding(self, rect):
+        n = self.count
+        left = np.trunc(self.x[:n])
+        top = np.trunc(self.y[:n])
+        return np.flatnonzero((left < rect.right) & (left + self.width > rect.left)
+                              & (top < rect.bottom) & (top + self.height > rect.top))
+
+    def struck(self, x, y, radius):
+        # one sweep over the slimes sorted by x finds the bullets whose boxes overlap any slime; hit() only
+        # has to scan for those, and its removals never create new overlaps
+        n = self.count
+        if n == 0 or len(radius) == 0:
+            return []
+        # the same truncated boxes hit() gets from pygame.Rect
+        radius = np.array(radius)
+        left = np.trunc(x - radius)
+        right = left + 2 * radius
+        slime_left = np.trunc(self.x[:n])
+        order = np.argsort(slime_left, kind="stable")
+        sorted_left = slime_left[order]
+        first = np.searchsorted(sorted_left, left - self.width, side="right")
+        counts = np.maximum(np.searchsorted(sorted_left, right, side="left") - first, 0)
+        if not counts.any():
+            return []
+        top = np.trunc(y - radius)
+        bottom = top + 2 * radius
+        slime_top = np.trunc(self.y[order])
+        owner = np.repeat(np.arange(len(radius)), counts)
+        candidate = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(len(owner))
+        overlap = (slime_top[candidate] < bottom[owner]) & (slime_top[candidate] + self.height > top[owner])
+        return np.flatnonzero(np.bincount(owner[overlap], minlength=len(radius))).tolist()
+
+    def touching(self, rect):
+        return len(self.colliding(rect)) > 0
+
+    def hit(self, rect, damage):
+        found = self.colliding(rect)
+        if len(found) == 0:
+            return False, False
+        i = found[0]
+        # the arrays reorder on removal, so cooldowns are stored as deadlines rather than timers
+        now = game_clock.ticks
+        if now >= self.recover_tick[i]:
+            self.hearts[i] = max(0, self.hearts[i] - damage)
+            self.recover_tick[i] = now + ms_to_ticks(DAMAGE_INTERVAL)
+        if self.hearts[i] <= 0:
+            self.remove(i)
+            return True, True
+        return True, False
+
+def shared_size(capacity, dtype):
+    # keep every array 8-byte aligned inside the shared block
+    return -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+
+def shared_arrays(memory, capacity, fields):
+    arrays = {}
+    offset = 0
+    for name, dtype in fields:
+        arrays[name] = np.ndarray(capacity, dtype=dtype, buffer=memory.buf, offset=offset)
+        offset += shared_size(capacity, dtype)
+    return arrays
+
+class WallWindow:
+    def __init__(self, cells):
+        self.cells = cells
+        self.left = 0
+        self.top = 0
+
+    def is_wall_batch(self, x, y, width, height):
+        x = np.trunc(x).astype(np.int64)
+        y = np.trunc(y).astype(np.int64)
+        if x.size == 0:
+            return np.zeros(x.shape, dtype=np.bool_)
+        rows, cols = self.cells.shape
+        cells = self.cells.reshape(-1)
+        left = x // CELL_SIZE
+        top = y // CELL_SIZE
+        right = (x + width) // CELL_SIZE
+        bottom = (y + height) // CELL_SIZE
+        # anything reaching past the window counts as a missing chunk, so only inside boxes need a lookup
+        hit = (left < self.left) | (top < self.top) | (right >= self.left + cols) | (bottom >= self.top + rows)
+        # every cell a box can touch, one (row, column) offset per leading axis
+        rows_spanned = np.arange(height // CELL_SIZE + 2)[:, None, None]
+        cols_spanned = np.arange(width // CELL_SIZE + 2)[None, :, None]
+        values = cells.take((top - self.top + rows_spanned) * cols + left - self.left + cols_spanned, mode="clip")
+        grid_y = (top + rows_spanned) * CELL_SIZE
+        in_zone = (y + height > grid_y) & (y < grid_y + CELL_SIZE * 0.3)
+        covered = (top + rows_spanned <= bottom) & (left + cols_spanned <= right)
+        hit |= (covered & ((values == MISSING_CHUNK) | ((values == 1) & in_zone))).any(axis=(0, 1))
+        return hit
+
+def slime_worker(connection, worker, seed, world_name, window, flow_radius):
+    # Ctrl+C reaches the whole process group, the game shuts its workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = multiprocessing.parent_process()
+    world_memory = shared_memory.SharedMemory(world_name)
+    walls = WallWindow(np.ndarray((window, window), dtype=np.uint8, buffer=world_memory.buf))
+    flow = FlowField(flow_radius)
+    flow.codes = np.ndarray(len(flow.flow), dtype=np.uint8, buffer=world_memory.buf, offset=window * window)
+    engine = BatchedSlimes(0, np.random.default_rng(None if seed is None else [seed, worker]))
+    memory = None
+    while True:
+        if connection not in multiprocessing.connection.wait([connection, parent.sentinel]):
+            break
+        message = connection.recv()
+        if message is None:
+            break
+        name, capacity, count, now, player_x, player_y, walls.left, walls.top, flow.left, flow.top = message
+        try:
+            if memory is None or memory.name != name:
+                if memory is not None:
+                    memory.close()
+                memory = shared_memory.SharedMemory(name)
+                for field, array in shared_arrays(memory, capacity, ParallelSlimes.SHARED_FIELDS).items():
+                    setattr(engine, field, array)
+                engine.capacity = capacity
+            engine.count = count
+            owned = np.flatnonzero(engine.owner[:count] == worker)
+            if owned.size:
+                engine.advance(owned, player_x, player_y, walls, flow, now)
+            connection.send(None)
+        except Exception as error:
+            connection.send(repr(error))
+    # drop the views before unmapping the buffers they point into
+    engine = walls = flow = None
+    if memory is not None:
+        memory.close()
+    world_memory.close()
+
+class ParallelSlimes(BatchedSlimes):
+    # the live arrays stay private to the game loop, workers advance a copy one tick ahead of it.
+    # source maps each live slot to its slot in that copy, or -1 for slimes spawned since it was taken
+    FIELDS = BatchedSlimes.FIELDS + (("source", "i8"),)
+    SHARED_FIELDS = BatchedSlimes.FIELDS + (("owner", "i1"),)
+    # everything advance() writes
+    MOVED_FIELDS = ("x", "y", "prev_x", "prev_y", "direction", "move_counter", "anim_counter", "anim_frame",
+                    "chasing", "updated")
+
+    def __init__(self, workers, capacity=256, rng=None, seed=None):
+        super().__init__(capacity, rng)
+        self.workers = workers
+        self.memory = None
+        self.shared = None
+        self.shared_capacity = 0
+        self.retired = []
+        self.pending = False
+        self.window = (2 * EVICT_RADIUS + 1) * CHUNK_CELLS
+        self.synced = None
+        flow_size = len(flow_field.flow)
+        self.world_memory = shared_memory.SharedMemory(create=True, size=self.window * self.window + flow_size)
+        self.walls = np.ndarray((self.window, self.window), dtype=np.uint8, buffer=self.world_memory.buf)
+        self.flow = self.world_memory.buf[self.window * self.window:self.window * self.window + flow_size]
+        context = multiprocessing.get_context(WORKER_START)
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            connection, child = context.Pipe()
+            process = context.Process(target=slime_worker, daemon=True, name=f"slime-worker-{worker}",
+                                      args=(child, worker, seed, self.world_memory.name, self.window, flow_field.radius))
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def spawn(self, x, y):
+        super().spawn(x, y)
+        self.source[self.count - 1] = -1
+
+    def share(self, capacity):
+        size = sum(shared_size(capacity, dtype) for name, dtype in self.SHARED_FIELDS)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, size))
+        if self.memory is not None:
+            # workers map the old block until their next step, so unlink it once they have moved on
+            self.retired.append(self.memory)
+        self.memory = memory
+        self.shared = shared_arrays(memory, capacity, self.SHARED_FIELDS)
+        self.shared_capacity = capacity
+
+    def sync_world(self, flow):
+        state = (world_map.center, world_map.revision)
+        if state != self.synced:
+            self.synced = state
+            self.left = (world_map.center[0] - EVICT_RADIUS) * CHUNK_CELLS
+            self.top = (world_map.center[1] - EVICT_RADIUS) * CHUNK_CELLS
+            region = world_map.region(self.left, self.top, self.window, self.window)
+            self.walls[:] = np.frombuffer(region, dtype=np.uint8).reshape(self.window, self.window)
+        self.flow[:] = flow.flow
+
+    def step(self, player_x, player_y, flow, members=None):
+        # this tick was worked out while the last frame rendered, the next one runs while this one renders
+        self.collect()
+        if self.count:
+            self.dispatch(player_x, player_y, flow, members)
+
+    def dispatch(self, player_x, player_y, flow, members=None):
+        n = self.count
+        self.sync_world(flow)
+        if self.shared_capacity < n:
+            self.share(self.capacity)
+        shared = self.shared
+        for name, dtype in BatchedSlimes.FIELDS:
+            shared[name][:n] = getattr(self, name)[:n]
+        self.source[:n] = np.arange(n)
+        index = self.schedule(player_x, player_y, members)
+        chunk_x = np.floor_divide(self.x[index], CHUNK_SIZE).astype(np.int64)
+        chunk_y = np.floor_divide(self.y[index], CHUNK_SIZE).astype(np.int64)
+        # slimes that are not due next tick get no owner, so every worker skips them
+        shared["owner"][:n] = -1
+        shared["owner"][index] = (chunk_x * 7 + chunk_y * 13) % self.workers
+        message = (self.memory.name, self.shared_capacity, n, game_clock.ticks + 1, player_x, player_y,
+                   self.left, self.top, flow.left, flow.top)
+        for connection in self.connections:
+            connection.send(message)
+        self.pending = True
+
+    def collect(self):
+        if not self.pending:
+            return
+        self.pending = False
+        errors = [error for error in (connection.recv() for connection in self.connections) if error]
+        for memory in self.retired:
+            memory.close()
+            memory.unlink()
+        self.retired = []
+        if errors:
+            raise RuntimeError(f"slime worker failed: {errors[0]}")
+        # hits, removals and spawns since the dispatch stay, only the moves come back
+        live = np.flatnonzero(self.source[:self.count] >= 0)
+        source = self.source[live]
+        moved = self.shared["owner"][source] >= 0
+        live = live[moved]
+        source = source[moved]
+        for name in self.MOVED_FIELDS:
+            getattr(self, name)[live] = self.shared[name][source]
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join(1)
+        self.connections = []
+        self.processes = []
+        self.shared = None
+        self.walls = None
+        self.flow.release()
+        for memory in self.retired + [self.memory, self.world_memory]:
+            if memory is None:
+                continue
+            memory.close()
+            memory.unlink()
+        self.retired = []
+
+class SpriteAtlas:
+    def __init__(self, name, alpha):
+        self.name = name
+        self.alpha = alpha
+        self.entries = {}
+        self.sprites = None
+        self.lock = threading.Lock()
+
+    def add(self, key, path, size):
+        self.entries[key] = (path, size)
+
+    def __getitem__(self, key):
+        if self.sprites is None:
+            self.load()
+        return self.sprites[key]
+
+    def sources(self):
+        return {key: [path, os.stat(path).st_mtime_ns, list(size)] for key, (path, size) in self.entries.items()}
+
+    def build(self):
+        images = {}
+        for key, (path, size) in self.entries.items():
+            image = pygame.image.load(path)
+            image = image.convert_alpha() if self.alpha else image.convert()
+            images[key] = pygame.transform.scale(image, size)
+        rects = {}
+        x = y = row_height = 0
+        for key in sorted(images, key=lambda key: -images[key].get_height()):
+            width, height = images[key].get_size()
+            if x + width > ATLAS_WIDTH:
+                x = 0
+                y += row_height
+                row_height = 0
+            rects[key] = [x, y, width, height]
+            x += width
+            row_height = max(row_height, height)
+
+        atlas = pygame.Surface((ATLAS_WIDTH, y + row_height), pygame.SRCALPHA if self.alpha else 0)
+        atlas.fill((0, 0, 0, 0))
+        for key, rect in rects.items():
+            atlas.blit(images[key], rect[:2], special_flags=pygame.BLEND_RGBA_MAX if self.alpha else 0)
+        return atlas, rects
+
+    def load(self):
+        with self.lock:
+            if self.sprites is not None:
+                return
+            sources = self.sources()
+            image_path = os.path.join(ASSET_CACHE_DIR, f"{self.name}.png")
+            index_path = os.path.join(ASSET_CACHE_DIR, f"{self.name}.json")
+            atlas = None
+            try:
+                with open(index_path) as index_file:
+                    index = json.load(index_file)
+                if index["version"] == ATLAS_VERSION and index["sources"] == sources:
+                    atlas = pygame.image.load(image_path)
+                    rects = index["rects"]
+            except (OSError, ValueError, KeyError, pygame.error):
+                atlas = None
+
+            if atlas is None:
+                atlas, rects = self.build()
+                try:
+                    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+                    pygame.image.save(atlas, image_path)
+                    with open(index_path, "w") as index_file:
+                        json.dump({"version": ATLAS_VERSION, "sources": sources, "rects": rects}, index_file)
+                except (OSError, pygame.error):
+                    pass
+
+            atlas = atlas.convert_alpha() if self.alpha else atlas.convert()
+            self.sprites = {key: atlas.subsurface(rect) for key, rect in rects.items()}
+
+class TextureIndex:
+    def __init__(self):
+        self.atlases = {}
+
+    def add(self, atlas, key, path, size):
+        atlas.add(key, path, size)
+        self.atlases[key] = atlas
+
+    def __getitem__(self, key):
+        return self.atlases[key][key]
+
+    def size(self, key):
+        return self.atlases[key].entries[key][1]
+
+class Animations:
+    DIRECTIONS = ("up", "down", "left", "right")
+
+    def __init__(self, atlas, pattern, size, frames=4):
+        self.atlas = atlas
+        self.keys = {}
+        self.frames = {}
+        for direction in self.DIRECTIONS:
+            self.keys[direction] = [pattern.format(direction=direction, frame=i) for i in range(1, frames + 1)]
+            for key in self.keys[direction]:
+                atlas.add(key, key, size)
+
+    def __getitem__(self, direction):
+        frames = self.frames.get(direction)
+        if frames is None:
+            frames = self.frames[direction] = [self.atlas[key] for key in self.keys[direction]]
+        return frames
+
+ground_atlas = SpriteAtlas("ground", alpha=False)
+sprite_atlas = SpriteAtlas("sprites", alpha=True)
+textures = TextureIndex()
+textures.add(ground_atlas, 'grass1', "texture/land/grass1.png", (CELL_SIZE, CELL_SIZE))
+textures.add(ground_atlas, 'grass2', "texture/land/grass2.png", (CELL_SIZE, CELL_SIZE))
+textures.add(sprite_atlas, 'flower', "texture/decor/flower.png", (40, 30))
+textures.add(sprite_atlas, 'rock', "texture/decor/rock.png", (50, 50))
+textures.add(sprite_atlas, 'pistol', "texture/weapons/pistol.png", (80, 60))
+textures.add(sprite_atlas, 'ak47', "texture/weapons/ak-47.png", (100, 50))
+textures.add(sprite_atlas, 'red_orb', "texture/items/red_orb.png", (30, 30))
+textures.add(sprite_atlas, 'heart', "texture/items/heart.png", (30, 30))
+textures.add(sprite_atlas, 'ammo', "texture/items/ammo.png", (30, 30))
 
 WEAPONS = {
     'pistol': WeaponConfig(name="Pistol", damage=2, fire_rate=2, bullet_speed=15, bullet_size=4,
@@ -291,297 +2088,1240 @@ WEAPONS = {
                          bullet_color=(255, 165, 0), ammo_capacity=30, spread=0.3)
 }
 
+# items collide as 30x30 but their sprites are drawn larger from the same top-left corner
+ITEM_SPRITE_SIZE = tuple(map(max, *(textures.size(key) for key in [*WEAPONS, 'ammo'])))
+
+def item_view(view):
+    width, height = ITEM_SPRITE_SIZE
+    return pygame.Rect(view.x - width, view.y - height, view.width + width, view.height + height)
+
 Slime.load_textures()
-MAP_SIZE = (10 * 10 * CELL_SIZE, 10 * 10 * CELL_SIZE)
-world_map = {}
-decorations = {}
-items_on_ground = []
-slimes = []
-bullets = []
-last_spawn_time = pygame.time.get_ticks() - SPAWN_INTERVAL
-
-for chunk_x in range(10):
-    for chunk_y in range(10):
-        chunk_type = random.choices([0, 1], weights=[95, 5])[0]
-        for x_in_chunk in range(10):
-            for y_in_chunk in range(10):
-                x = chunk_x * 10 * CELL_SIZE + x_in_chunk * CELL_SIZE
-                y = chunk_y * 10 * CELL_SIZE + y_in_chunk * CELL_SIZE
-                world_map[(x, y)] = random.choices([0, 1], weights=([99, 1] if chunk_type == 1 else [95, 5]))[0]
-
-                if world_map[(x, y)] == 0:
-                    spawn_chance = random.random()
-                    if spawn_chance < 0.005:
-                        weapon_name = random.choice(list(WEAPONS.keys()))
-                        items_on_ground.append(Item(
-                            x + CELL_SIZE // 2,
-                            y + CELL_SIZE // 2,
-                            textures[weapon_name],
-                            Weapon(WEAPONS[weapon_name], textures[weapon_name])
-                        ))
-                    elif spawn_chance < 0.03:
-                        items_on_ground.append(AmmoItem(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
-                    elif random.random() < 0.1:
-                        decorations[(x, y)] = random.choice(['flower', 'rock'])
-
-player_frames = {
-    "down": [pygame.transform.scale(pygame.image.load(f"chart/down/player{i}.png").convert_alpha(), (60, 80)) for i in range(1, 5)],
-    "up": [pygame.transform.scale(pygame.image.load(f"chart/up/player{i}.png").convert_alpha(), (60, 80)) for i in range(1, 5)],
-    "left": [pygame.transform.scale(pygame.image.load(f"chart/left/player{i}.png").convert_alpha(), (60, 80)) for i in range(1, 5)],
-    "right": [pygame.transform.scale(pygame.image.load(f"chart/right/player{i}.png").convert_alpha(), (60, 80)) for i in range(1, 5)]
-}
+player_frames = Animations(SpriteAtlas("player", alpha=True), "chart/{direction}/player{frame}.png", (60, 80))
+
+WALL_WEIGHTS = {0: [95, 5], 1: [99, 1]}
+DECORATIONS = ['flower', 'rock']
+
+SEED_POOL_SIZE = 4
+PCG_MULTIPLIER = 0x2360ED051FC65DA44385DF649FCCF645
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+MASK128 = (1 << 128) - 1
+
+def seed_mix(x, y):
+    result = (0xCA01F9DD * x - 0x4973F715 * y) & MASK32
+    return result ^ result >> 16
+
+def seed_state(values, words):
+    # NumPy's SeedSequence: hash the entropy words into a pool, then hash the pool out into state words
+    entropy = []
+    for value in values:
+        entropy.append(value & MASK32)
+        value >>= 32
+        while value:
+            entropy.append(value & MASK32)
+            value >>= 32
+    constant = 0x43B0D7E5
+
+    def hashed(value):
+        nonlocal constant
+        value = (value ^ constant) * (constant * 0x931E8875 & MASK32) & MASK32
+        constant = constant * 0x931E8875 & MASK32
+        return value ^ value >> 16
+
+    pool = [hashed(entropy[i] if i < len(entropy) else 0) for i in range(SEED_POOL_SIZE)]
+    for source in range(SEED_POOL_SIZE):
+        for target in range(SEED_POOL_SIZE):
+            if source != target:
+                pool[target] = seed_mix(pool[target], hashed(pool[source]))
+    for value in entropy[SEED_POOL_SIZE:]:
+        for target in range(SEED_POOL_SIZE):
+            pool[target] = seed_mix(pool[target], hashed(value))
+    state = []
+    constant = 0x8B51F9DD
+    for i in range(words):
+        value = pool[i % SEED_POOL_SIZE] ^ constant
+        constant = constant * 0x58F38DED & MASK32
+        value = value * constant & MASK32
+        state.append(value ^ value >> 16)
+    return state
+
+class ChunkRandom:
+    # pure-Python PCG64 seeded like np.random.default_rng, so worlds match with or without NumPy
+    def __init__(self, values):
+        words = seed_state(values, 8)
+        seed_high, seed_low, inc_high, inc_low = (words[i] | words[i + 1] << 32 for i in range(0, 8, 2))
+        self.increment = ((inc_high << 64 | inc_low) << 1 | 1) & MASK128
+        self.state = 0
+        self.next64()
+        self.state = (self.state + (seed_high << 64 | seed_low)) & MASK128
+        self.next64()
+        self.spare = None
+
+    def next64(self):
+        self.state = (self.state * PCG_MULTIPLIER + self.increment) & MASK128
+        rotation = self.state >> 122
+        value = (self.state >> 64 ^ self.state) & MASK64
+        return (value >> rotation | value << (64 - rotation)) & MASK64
+
+    def next32(self):
+        if self.spare is not None:
+            value, self.spare = self.spare, None
+            return value
+        value = self.next64()
+        self.spare = value >> 32
+        return value & MASK32
+
+    def random(self):
+        return (self.next64() >> 11) * (1.0 / 9007199254740992.0)
+
+    def integers(self, high):
+        product = self.next32() * high
+        if product & MASK32 < high:
+            threshold = (MASK32 - high + 1) % high
+            while product & MASK32 < threshold:
+                product = self.next32() * high
+        return product >> 32
+
+def roll_chunk(seed, chunk_x, chunk_y):
+    # the canonical world generator; roll_chunk_batch only takes the same draws faster
+    chunk_rng = ChunkRandom([value % 2 ** 64 for value in (seed, chunk_x, chunk_y)])
+    cells = CHUNK_CELLS * CHUNK_CELLS
+    chunk_type = int(chunk_rng.random() < 0.05)
+    weights = WALL_WEIGHTS[chunk_type]
+    walls = bytearray(chunk_rng.random() < weights[1] / sum(weights) for _ in range(cells))
+    spawn_chance = [chunk_rng.random() for _ in range(cells)]
+    decoration_chance = [chunk_rng.random() for _ in range(cells)]
+    weapon_pick = [chunk_rng.integers(len(WEAPONS)) for _ in range(cells)]
+    decoration_pick = [chunk_rng.integers(len(DECORATIONS)) for _ in range(cells)]
+
+    names = list(WEAPONS.keys())
+    open_cells = [i for i in range(cells) if not walls[i]]
+    contents = [(i % CHUNK_CELLS, i // CHUNK_CELLS, names[weapon_pick[i]])
+                for i in open_cells if spawn_chance[i] < 0.005]
+    contents += [(i % CHUNK_CELLS, i // CHUNK_CELLS, "ammo")
+                 for i in open_cells if 0.005 <= spawn_chance[i] < 0.03]
+    contents += [(i % CHUNK_CELLS, i // CHUNK_CELLS, DECORATIONS[decoration_pick[i]])
+                 for i in open_cells if spawn_chance[i] >= 0.03 and decoration_chance[i] < 0.1]
+    return walls, contents
+
+def roll_chunk_batch(seed, chunk_x, chunk_y):
+    # roll_chunk's draws taken straight from the PCG64 stream, whose output NumPy keeps stable across
+    # releases, unlike Generator's methods; the seed sequence only takes non-negative words
+    stream = np.random.PCG64(np.random.SeedSequence([value % 2 ** 64 for value in (seed, chunk_x, chunk_y)]))
+    shape = (CHUNK_CELLS, CHUNK_CELLS)
+    cells = CHUNK_CELLS * CHUNK_CELLS
+    raw = stream.random_raw(1 + 3 * cells + cells)
+    chances = (raw[:1 + 3 * cells] >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+    chunk_type = int(chances[0] < 0.05)
+    weights = WALL_WEIGHTS[chunk_type]
+    walls = (chances[1:1 + cells] < weights[1] / sum(weights)).reshape(shape)
+    spawn_chance = chances[1 + cells:1 + 2 * cells].reshape(shape)
+    decoration_chance = chances[1 + 2 * cells:].reshape(shape)
+    # ChunkRandom.integers: each 64-bit output feeds two 32-bit draws, low half first
+    pairs = raw[1 + 3 * cells:]
+    halves = np.stack([pairs & np.uint64(MASK32), pairs >> np.uint64(32)], axis=1).ravel()
+    picks = []
+    for high, draws in ((len(WEAPONS), halves[:cells]), (len(DECORATIONS), halves[cells:])):
+        product = draws * np.uint64(high)
+        if ((product & np.uint64(MASK32)) < (MASK32 - high + 1) % high).any():
+            # a rejected draw shifts every later one; only a count that isn't a power of two can reject
+            return roll_chunk(seed, chunk_x, chunk_y)
+        picks.append((product >> np.uint64(32)).reshape(shape))
+    weapon_pick, decoration_pick = picks
+
+    open_cells = ~walls
+    weapons = open_cells & (spawn_chance < 0.005)
+    ammo = open_cells & (spawn_chance >= 0.005) & (spawn_chance < 0.03)
+    decorations = open_cells & (spawn_chance >= 0.03) & (decoration_chance < 0.1)
+
+    names = list(WEAPONS.keys())
+    contents = [(x, y, names[weapon_pick[y, x]]) for y, x in np.argwhere(weapons).tolist()]
+    contents += [(x, y, "ammo") for y, x in np.argwhere(ammo).tolist()]
+    contents += [(x, y, DECORATIONS[decoration_pick[y, x]]) for y, x in np.argwhere(decorations).tolist()]
+    return walls.astype(np.uint8).tobytes(), contents
+
+def generate_chunk(seed, chunk_x, chunk_y):
+    chunk = Chunk(chunk_x, chunk_y)
+    walls, contents = (roll_chunk_batch if np is not None else roll_chunk)(seed, chunk_x, chunk_y)
+    chunk.walls.cells[:] = walls
+    for x_in_chunk, y_in_chunk, content in contents:
+        x = chunk_x * CHUNK_SIZE + x_in_chunk * CELL_SIZE
+        y = chunk_y * CHUNK_SIZE + y_in_chunk * CELL_SIZE
+        if content == "ammo":
+            chunk.items.append(AmmoItem(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
+        elif content in WEAPONS:
+            chunk.items.append(Item(
+                x + CELL_SIZE // 2,
+                y + CELL_SIZE // 2,
+                textures[content],
+                Weapon(WEAPONS[content], textures[content])
+            ))
+        else:
+            chunk.decorations[(x, y)] = content
+    return chunk
+
+chunk_generator = generate_chunk
+world_map = None
+slimes = None
+flow_field = None
+profiler = None
+save_store = None
+
+SESSION_HEADER = struct.Struct("<4sHQqqqIiib")
+PLAYER_RECORD = struct.Struct("<ddhh")
+SLOT_RECORD = struct.Struct("<Bi")
+SLIME_RECORD = struct.Struct("<ddhB")
+INDEX_RECORD = struct.Struct("<iiQI")
+CHUNK_FILE_HEADER = struct.Struct("<4sH")
+CHUNK_RECORD = struct.Struct("<iiHH")
+ITEM_RECORD = struct.Struct("<ddBi")
+DECORATION_RECORD = struct.Struct("<HB")
+COUNT = struct.Struct("<I")
+NO_WEAPON = 255
+
+def config_index(config):
+    return next(i for i, other in enumerate(WEAPONS.values()) if other is config)
+
+def weapon_index(weapon):
+    return config_index(weapon.config)
+
+def make_weapon(index, ammo):
+    name = list(WEAPONS)[index]
+    weapon = Weapon(WEAPONS[name], textures[name])
+    weapon.current_ammo = ammo
+    return weapon
+
+def encode_chunk(chunk, items):
+    parts = [CHUNK_RECORD.pack(chunk.x, chunk.y, len(items), len(chunk.decorations)), bytes(chunk.walls.cells)]
+    for item in items:
+        if isinstance(item.original, Weapon):
+            parts.append(ITEM_RECORD.pack(item.x, item.y, weapon_index(item.original), item.original.current_ammo))
+        else:
+            parts.append(ITEM_RECORD.pack(item.x, item.y, NO_WEAPON, item.amount))
+    for (x, y), name in chunk.decorations.items():
+        cell = (y // CELL_SIZE % CHUNK_CELLS) * CHUNK_CELLS + x // CELL_SIZE % CHUNK_CELLS
+        parts.append(DECORATION_RECORD.pack(cell, DECORATIONS.index(name)))
+    return b"".join(parts)
+
+def decode_chunk(data, offset):
+    chunk_x, chunk_y, item_count, decoration_count = CHUNK_RECORD.unpack_from(data, offset)
+    offset += CHUNK_RECORD.size
+    chunk = Chunk(chunk_x, chunk_y)
+    chunk.walls.cells[:] = data[offset:offset + len(chunk.walls.cells)]
+    offset += len(chunk.walls.cells)
+    for x, y, kind, amount in ITEM_RECORD.iter_unpack(data[offset:offset + item_count * ITEM_RECORD.size]):
+        if kind == NO_WEAPON:
+            item = AmmoItem(x, y)
+            item.amount = amount
+        else:
+            weapon = make_weapon(kind, amount)
+            item = Item(x, y, weapon.texture, weapon)
+        chunk.items.append(item)
+    offset += item_count * ITEM_RECORD.size
+    for cell, kind in DECORATION_RECORD.iter_unpack(data[offset:offset + decoration_count * DECORATION_RECORD.size]):
+        x = chunk_x * CHUNK_SIZE + cell % CHUNK_CELLS * CELL_SIZE
+        y = chunk_y * CHUNK_SIZE + cell // CHUNK_CELLS * CELL_SIZE
+        chunk.decorations[(x, y)] = DECORATIONS[kind]
+    return chunk
+
+class SaveStore:
+    def __init__(self, path):
+        self.path = path
+        self.session_path = os.path.join(path, "session.bin")
+        self.chunks_path = os.path.join(path, "chunks.bin")
+        self.session = None
+        self.seed = None
+        self.index = {}
+        self.view = None
+
+    def exists(self):
+        return os.path.exists(self.session_path)
+
+    def open(self):
+        with open(self.session_path, "rb") as file:
+            self.session = file.read()
+        magic, version, self.seed = SESSION_HEADER.unpack_from(self.session)[:3]
+        if magic != b"SLMS" or version != SAVE_VERSION:
+            raise ValueError(f"{self.session_path} is not a version {SAVE_VERSION} save")
+        # the chunk index sits at the end of the session so it can be rewritten with it
+        count_offset = len(self.session) - COUNT.size
+        count, = COUNT.unpack_from(self.session, count_offset)
+        index_offset = count_offset - count * INDEX_RECORD.size
+        for chunk_x, chunk_y, offset, length in INDEX_RECORD.iter_unpack(self.session[index_offset:count_offset]):
+            self.index[(chunk_x, chunk_y)] = (offset, length)
+        self.session = self.session[:index_offset]
+        self.remap()
+
+    def remap(self):
+        # a streaming worker may still be decoding from the old map, so only drop the reference to it
+        with open(self.chunks_path, "rb") as file:
+            self.view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def chunk(self, seed, chunk_x, chunk_y):
+        entry = self.index.get((chunk_x, chunk_y))
+        if entry is None:
+            return chunk_generator(seed, chunk_x, chunk_y)
+        return decode_chunk(self.view, entry[0])
+
+    def write(self, chunks, session):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.chunks_path, "ab") as file:
+            if file.tell() == 0:
+                file.write(CHUNK_FILE_HEADER.pack(b"SLMC", SAVE_VERSION))
+            # changed chunks are appended and re-pointed; superseded records stay in the file
+            for chunk, items in chunks:
+                record = encode_chunk(chunk, items)
+                self.index[(chunk.x, chunk.y)] = (file.tell(), len(record))
+                file.write(record)
+            size = file.tell()
+        live = sum(length for offset, length in self.index.values())
+        if size - CHUNK_FILE_HEADER.size - live > live:
+            self.compact()
+        parts = [session]
+        parts += [INDEX_RECORD.pack(chunk_x, chunk_y, offset, length)
+                  for (chunk_x, chunk_y), (offset, length) in self.index.items()]
+        parts.append(COUNT.pack(len(self.index)))
+        with open(self.session_path + ".tmp", "wb") as file:
+            file.write(b"".join(parts))
+        os.replace(self.session_path + ".tmp", self.session_path)
+        self.remap()
+
+    def compact(self):
+        # once superseded records outweigh the live ones, copy only the live ones into a fresh file
+        with open(self.chunks_path, "rb") as file:
+            data = file.read()
+        with open(self.chunks_path + ".tmp", "wb") as file:
+            file.write(CHUNK_FILE_HEADER.pack(b"SLMC", SAVE_VERSION))
+            for key, (offset, length) in self.index.items():
+                self.index[key] = (file.tell(), length)
+                file.write(data[offset:offset + length])
+        os.replace(self.chunks_path + ".tmp", self.chunks_path)
+
+def save_game(store):
+    chunks = list(world_map.saved_chunks())
+    parts = [SESSION_HEADER.pack(b"SLMS", SAVE_VERSION, world_map.seed % 2 ** 64, game_clock.ticks, start_time,
+                                 last_spawn_time, killed_slimes, SPAWN_INTERVAL, DAMAGE_INTERVAL, inventory.selected),
+             PLAYER_RECORD.pack(player.x, player.y, player.health.current_hearts, player.health.max_hearts)]
+    for slot in inventory.slots:
+        if isinstance(slot, Weapon):
+            parts.append(SLOT_RECORD.pack(weapon_index(slot), slot.current_ammo))
+        else:
+            parts.append(SLOT_RECORD.pack(NO_WEAPON, 0))
+    records = list(slimes.records())
+    parts.append(COUNT.pack(len(records)))
+    parts += [SLIME_RECORD.pack(*record) for record in records]
+    store.write(chunks, b"".join(parts))
+    world_map.modified.clear()
+
+def load_game(store, simulated_clock=False):
+    global last_spawn_time, start_time, killed_slimes, SPAWN_INTERVAL, DAMAGE_INTERVAL
+
+    store.open()
+    reset(store.seed, simulated_clock, store)
+    data = store.session
+    header = SESSION_HEADER.unpack_from(data)
+    game_clock.ticks, start_time, last_spawn_time, killed_slimes = header[3:7]
+    SPAWN_INTERVAL, DAMAGE_INTERVAL, inventory.selected = header[7:]
+    offset = SESSION_HEADER.size
+    start_timers()
+
+    player.x, player.y, player.health.current_hearts, player.health.max_hearts = PLAYER_RECORD.unpack_from(data, offset)
+    player.prev_x, player.prev_y = player.x, player.y
+    offset += PLAYER_RECORD.size
+    for i in range(len(inventory.slots)):
+        kind, ammo = SLOT_RECORD.unpack_from(data, offset)
+        inventory.slots[i] = None if kind == NO_WEAPON else make_weapon(kind, ammo)
+        offset += SLOT_RECORD.size
+
+    count, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for record in SLIME_RECORD.iter_unpack(data[offset:offset + count * SLIME_RECORD.size]):
+        slimes.restore(*record)
+    world_map.update(player.x, player.y)
+
+def spawn_wave():
+    global last_spawn_time
+
+    for anchor in roster:
+        if anchor.health.current_hearts > 0 and len(slimes) < MAX_SLIMES:
+            for _ in range(SPAWN_ATTEMPTS):
+                new_x = rng.randint(int(anchor.x) - 500, int(anchor.x) + 500)
+                new_y = rng.randint(int(anchor.y) - 500, int(anchor.y) + 500)
+                if not slimes.touching(pygame.Rect(new_x, new_y, 60, 80)):
+                    slimes.spawn(new_x, new_y)
+                    break
+            last_spawn_time = game_clock.get_ticks()
+    timers.schedule(ms_to_ticks(SPAWN_INTERVAL), spawn_wave)
+
+def raise_difficulty(spawn_cut, damage_cut):
+    global SPAWN_INTERVAL, DAMAGE_INTERVAL
+
+    SPAWN_INTERVAL -= spawn_cut
+    DAMAGE_INTERVAL -= damage_cut
+
+def start_timers():
+    global timers
+
+    now = game_clock.ticks
+    timers = TimerWheel(WHEEL_SLOTS, now)
+    timers.schedule(ms_to_ticks(last_spawn_time + SPAWN_INTERVAL) - now, spawn_wave)
+    for at, spawn_cut, damage_cut in DIFFICULTY_STEPS:
+        # a resumed session has already applied the steps it passed
+        if ms_to_ticks(at) > now:
+            timers.schedule(ms_to_ticks(at) - now, raise_difficulty, spawn_cut, damage_cut)
+
+def reset(seed=None, simulated_clock=False, store=None, threaded_world=None):
+    global game_clock, world_map, flow_field, items_on_ground, bullets, slimes
+    global player, roster, camera, ground, inventory, hud, dirty_rects, render_queue, profiler
+    global last_spawn_time, start_time, killed_slimes
+    global SPAWN_INTERVAL, DAMAGE_INTERVAL, save_store
+
+    rng.seed(seed)
+    save_store = store
+    game_clock = GameClock(TICK_RATE, RENDER_FPS, simulated_clock)
+    SPAWN_INTERVAL = BASE_SPAWN_INTERVAL
+    DAMAGE_INTERVAL = BASE_DAMAGE_INTERVAL
+
+    if world_map is not None:
+        world_map.close()
+    world_seed = seed if seed is not None else rng.getrandbits(32)
+    if threaded_world is None:
+        threaded_world = not simulated_clock
+    world_map = ChunkedWorld(world_seed, store.chunk if store is not None else chunk_generator,
+                             threaded=threaded_world)
+    flow_field = FlowField(Slime.DETECTION_RADIUS // CELL_SIZE + FLOW_MARGIN)
+    world_map.flows.append(flow_field)
+    items_on_ground = SpatialHash(CELL_SIZE)
+    bullets = BulletPool(MAX_BULLETS)
+
+    if slimes is not None:
+        slimes.close()
+    if SLIME_WORKERS and np is not None:
+        slimes = ParallelSlimes(SLIME_WORKERS, rng=np.random.default_rng(seed), seed=seed)
+    elif BATCHED_SLIMES and np is not None:
+        slimes = BatchedSlimes(rng=np.random.default_rng(seed))
+    else:
+        slimes = SlimeSwarm(CELL_SIZE)
+
+    player = Player()
+    roster = [player]
+    camera = Camera()
+    ground = GroundCache(GROUND_CACHE_CHUNKS)
+    dirty_rects = DirtyRects(DIRTY_RECTS)
+    render_queue = RenderQueue(LAYER_PLAYER + 1)
+    if profiler is not None:
+        profiler.close()
+    profiler = FrameProfiler(PROFILE_CSV)
+    world_map.update(player.x, player.y)
+    inventory = Inventory()
+    inventory.add_item(Weapon(WEAPONS['pistol'], textures['pistol']))
+    inventory.add_item(Weapon(WEAPONS['ak47'], textures['ak47']))
+    hud = Hud(inventory, player.health)
+
+    last_spawn_time = game_clock.get_ticks() - SPAWN_INTERVAL
+    start_time = game_clock.get_ticks()
+    killed_slimes = 0
+    start_timers()
+
+    # textures, atlases and the starting world live for the whole session, so move them out of
+    # the collector's way instead of rescanning them on every full collection
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+def inventory_slot_at(pos):
+    mx, my = pos
+    if inventory.pos[1] <= my <= inventory.pos[1] + 64:
+        for i in range(5):
+            slot_x = inventory.pos[0] + i * (64 + 10)
+            if slot_x <= mx <= slot_x + 64:
+                return i
+    return None
+
+def walk(player, keys, direction):
+    moving = False
+    if keys[pygame.K_a]:
+        player.x -= player.speed
+        direction = "left"
+        moving = True
+    if keys[pygame.K_d]:
+        player.x += player.speed
+        direction = "right"
+        moving = True
+    if keys[pygame.K_w]:
+        player.y -= player.speed
+        direction = "up"
+        moving = True
+    if keys[pygame.K_s]:
+        player.y += player.speed
+        direction = "down"
+        moving = True
+
+    if is_wall(player.x, player.y, player.width, player.height):
+        player.x, player.y = player.prev_x, player.prev_y
+    return direction, moving
+
+def fire(player, inventory, direction):
+    if inventory.selected != -1:
+        selected_item = inventory.slots[inventory.selected]
+        if isinstance(selected_item, Weapon) and selected_item.shoot():
+            angle = {"right": 0, "left": 180, "up": 90, "down": 270}[direction]
+            radian_angle = math.radians(angle + selected_item.config.spread * 10)
+            bx = player.x + player.width // 2 + math.cos(radian_angle) * 20
+            by = player.y + player.height // 2 - math.sin(radian_angle) * 20
+            bullets.spawn(bx, by, direction, selected_item.config)
+
+def reload(inventory):
+    if inventory.selected != -1:
+        weapon = inventory.slots[inventory.selected]
+        if isinstance(weapon, Weapon):
+            if weapon.config.name != "Pistol":
+                weapon.current_ammo = weapon.config.ammo_capacity
+
+def pick_up(player, inventory):
+    center_x = player.x + player.width / 2
+    center_y = player.y + player.height / 2
+    reach = pygame.Rect(center_x - 50, center_y - 50, 100, 100)
+    for item in items_on_ground.query(reach):
+        distance = math.hypot(
+            center_x - (item.x + item.width / 2),
+            center_y - (item.y + item.height / 2)
+        )
+        if distance < 50:
+            if isinstance(item, Item) and isinstance(item.original, Weapon):
+                if inventory.add_item(item.original):
+                    items_on_ground.remove(item)
+                    world_map.touch(item.x, item.y)
+                    dirty_rects.invalidate()
+                    break
+            else:
+                if inventory.add_item(item):
+                    items_on_ground.remove(item)
+                    world_map.touch(item.x, item.y)
+                    dirty_rects.invalidate()
+                    break
+
+def drop_item(player, inventory):
+    if inventory.selected == -1:
+        return
+    dropped_item = inventory.remove_item(inventory.selected)
+    if dropped_item:
+        drop_x = player.x + player.width // 2 - 15
+        drop_y = player.y + player.height // 2 - 15
+        items_on_ground.add(Item(drop_x, drop_y, dropped_item.texture, dropped_item))
+        world_map.touch(drop_x, drop_y)
+        dirty_rects.invalidate()
+
+def run(frames=None, input_driver=None, frame_times=None):
+    global killed_slimes
+
+    input_driver = input_driver or LiveInput()
+    running = True
+    frame_index = 0
+    current_frame = 0
+    animation_speed = 0.15
+    current_direction = "down"
+    is_moving = False
+    auto_fire = False
+    game_over = False
+    survived = 0
+
+    def animate():
+        nonlocal current_frame, animation
+        if is_moving and not game_over:
+            current_frame = (current_frame + 1) % 4
+        animation = timers.schedule(ms_to_ticks(animation_speed * 1000), animate)
 
-player = Player(MAP_SIZE)
-camera = Camera(MAP_SIZE)
-inventory = Inventory()
-inventory.add_item(Weapon(WEAPONS['pistol'], textures['pistol']))
-inventory.add_item(Weapon(WEAPONS['ak47'], textures['ak47']))
-
-start_time = pygame.time.get_ticks()
-killed_slimes = 0
-
-running = True
-clock = pygame.time.Clock()
-current_frame = 0
-last_update = pygame.time.get_ticks()
-animation_speed = 0.15
-current_direction = "down"
-auto_fire = False
-game_over = False
-game_over_time = 0
-
-while running:
-    dt = clock.tick(60)
-    screen.fill((135, 206, 235))
-    current_time = pygame.time.get_ticks()
+    def finish():
+        nonlocal running
+        running = False
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
+    animation = timers.schedule(ms_to_ticks(animation_speed * 1000), animate)
+    ending = None
+
+    while running:
+        if frames is not None and frame_index >= frames:
+            break
+        frame_index += 1
+        frame_start = time.perf_counter_ns()
+
+        steps = game_clock.tick()
+        profiler.begin()
+
+        for event in input_driver.events():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F5 and save_store is not None and not game_over:
+                save_game(save_store)
+
+            if not game_over:
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    slot = inventory_slot_at(event.pos)
+                    if slot is not None:
+                        inventory.selected = slot
+
+                    if event.button == 1:
+                        auto_fire = True
+                    if event.button == 3:
+                        reload(inventory)
+
+                if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                    auto_fire = False
+
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_f:
+                        pick_up(player, inventory)
+                    if event.key == pygame.K_q:
+                        drop_item(player, inventory)
+        profiler.lap("events")
+
+        for _ in range(steps):
+            game_clock.advance()
+            player.prev_x, player.prev_y = player.x, player.y
+            timers.advance(game_clock.ticks)
+            profiler.lap("spawn")
+
+            if not game_over:
+                current_direction, is_moving = walk(player, input_driver.pressed(), current_direction)
+                if auto_fire:
+                    fire(player, inventory, current_direction)
+                profiler.lap("movement")
+
+            if not game_over:
+                killed_slimes += bullets.step(slimes, world_map.bounds())
+            profiler.lap("bullets")
+
+            if not game_over:
+                flow_field.update(player.x + player.width / 2, player.y + player.height / 2)
+                slimes.step(player.x, player.y, flow=flow_field)
+
+                player_rect = pygame.Rect(player.x, player.y, player.width, player.height)
+                if slimes.touching(player_rect):
+                    player.health.take_damage(1)
+                profiler.lap("slimes")
+
+            if player.health.current_hearts <= 0 and not game_over:
+                game_over = True
+                survived = game_clock.get_ticks() - start_time
+                # keep rendering the game-over box until the delay runs out instead of blocking the loop
+                ending = timers.schedule(ms_to_ticks(GAME_OVER_DELAY), finish)
+
+        alpha = game_clock.alpha()
+        camera.update(player, alpha)
+        world_map.update(camera.x + camera.width // 2, camera.y + camera.height // 2)
+        profiler.lap("world")
+
+        screen.fill((135, 206, 235))
+        ground.draw(render_queue, camera)
+        profiler.lap("tiles")
+
+        render_queue.extend(LAYER_ITEMS, [
+            (item.texture, (item.x - camera.x, item.y - camera.y))
+            for item in items_on_ground.query(item_view(pygame.Rect(camera.x, camera.y, camera.width, camera.height)))
+        ])
+        profiler.lap("items")
+
+        bullets.draw(render_queue, camera, alpha)
+        profiler.lap("bullets")
 
         if not game_over:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = pygame.mouse.get_pos()
-                if inventory.pos[1] <= my <= inventory.pos[1] + 64:
-                    for i in range(5):
-                        slot_x = inventory.pos[0] + i * (64 + 10)
-                        if slot_x <= mx <= slot_x + 64:
-                            inventory.selected = i
-
-                if event.button == 1:
-                    auto_fire = True
-                if event.button == 3:
-                    if inventory.selected != -1:
-                        weapon = inventory.slots[inventory.selected]
-                        if isinstance(weapon, Weapon):
-                            if weapon.config.name != "Pistol":
-                                weapon.current_ammo = weapon.config.ammo_capacity
-
-            if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-                auto_fire = False
+            slimes.draw(render_queue, camera, alpha)
 
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_f:
-                    for item in items_on_ground[:]:
-                        distance = math.hypot(
-                            player.x + player.width / 2 - (item.x + item.width / 2),
-                            player.y + player.height / 2 - (item.y + item.height / 2)
-                        )
-                        if distance < 50:
-                            if isinstance(item, Item) and isinstance(item.original, Weapon):
-                                if inventory.add_item(item.original):
-                                    items_on_ground.remove(item)
-                                    break
-                            else:
-                                if inventory.add_item(item):
-                                    items_on_ground.remove(item)
-                                    break
-
-                if event.key == pygame.K_q and inventory.selected != -1:
-                    dropped_item = inventory.remove_item(inventory.selected)
-                    if dropped_item:
-                        drop_x = player.x + player.width // 2 - 15
-                        drop_y = player.y + player.height // 2 - 15
-                        items_on_ground.append(Item(drop_x, drop_y, dropped_item.texture, dropped_item))
-
-    if not game_over:
-        if len(slimes) < MAX_SLIMES and current_time - last_spawn_time > SPAWN_INTERVAL:
-            new_x = random.randint(max(0, int(player.x) - 500), min(MAP_SIZE[0], int(player.x) + 500))
-            new_y = random.randint(max(0, int(player.y) - 500), min(MAP_SIZE[1], int(player.y) + 500))
-            slimes.append(Slime(new_x, new_y))
-            last_spawn_time = current_time
-
-        keys = pygame.key.get_pressed()
-        prev_x, prev_y = player.x, player.y
-        is_moving = False
-
-        if keys[pygame.K_a]:
-            player.x -= player.speed
-            current_direction = "left"
-            is_moving = True
-        if keys[pygame.K_d]:
-            player.x += player.speed
-            current_direction = "right"
-            is_moving = True
-        if keys[pygame.K_w]:
-            player.y -= player.speed
-            current_direction = "up"
-            is_moving = True
-        if keys[pygame.K_s]:
-            player.y += player.speed
-            current_direction = "down"
-            is_moving = True
-
-        if is_wall(player.x, player.y, player.width, player.height):
-            player.x, player.y = prev_x, prev_y
-        player.x = max(0, min(MAP_SIZE[0] - player.width, player.x))
-        player.y = max(0, min(MAP_SIZE[1] - player.height, player.y))
-
-        if auto_fire and inventory.selected != -1:
-            selected_item = inventory.slots[inventory.selected]
-            if isinstance(selected_item, Weapon) and selected_item.shoot():
-                angle = {"right": 0, "left": 180, "up": 90, "down": 270}[current_direction]
-                radian_angle = math.radians(angle + selected_item.config.spread * 10)
-                bx = player.x + player.width // 2 + math.cos(radian_angle) * 20
-                by = player.y + player.height // 2 - math.sin(radian_angle) * 20
-                bullets.append(Bullet(bx, by, current_direction, selected_item.config))
+            player_sprite = player_frames[current_direction][current_frame]
+            player_pos = (lerp(player.prev_x, player.x, alpha), lerp(player.prev_y, player.y, alpha))
+            render_queue.add(LAYER_PLAYER, player_sprite, camera.apply(player_pos))
+        profiler.lap("slimes")
 
-    camera.update(player)
+        render_queue.flush(screen)
+        profiler.lap("blits")
 
-    for y in range(0, MAP_SIZE[1], CELL_SIZE):
-        for x in range(0, MAP_SIZE[0], CELL_SIZE):
-            if (x < camera.x - CELL_SIZE
-                    or x > camera.x + camera.width + CELL_SIZE
-                    or y < camera.y - CELL_SIZE
-                    or y > camera.y + camera.height + CELL_SIZE):
-                continue
-
-            texture = 'grass2' if world_map.get((x, y), 0) else 'grass1'
-            screen.blit(textures[texture], camera.apply((x, y)))
-
-            if (x, y) in decorations:
-                decor_type = decorations[(x, y)]
-                pos = (x + CELL_SIZE // 2 - 15, y + CELL_SIZE - 40)
-                screen.blit(textures[decor_type], camera.apply(pos))
-
-    for item in items_on_ground:
-        screen.blit(item.texture, camera.apply((item.x, item.y)))
-
-    for bullet in bullets[:]:
-        dx = 0
-        dy = 0
-        speed = bullet.speed
-        if bullet.direction == "right":
-            dx = speed
-        elif bullet.direction == "left":
-            dx = -speed
-        elif bullet.direction == "up":
-            dy = -speed
-        elif bullet.direction == "down":
-            dy = speed
-
-        dx += math.cos(math.radians(bullet.spread)) * speed * 0.1
-        dy += math.sin(math.radians(bullet.spread)) * speed * 0.1
-
-        bullet.x += dx
-        bullet.y += dy
-
-        bullet_rect = pygame.Rect(bullet.x - bullet.radius, bullet.y - bullet.radius,
-                                  bullet.radius * 2, bullet.radius * 2)
-        pygame.draw.circle(
-            screen,
-            bullet.color,
-            camera.apply((int(bullet.x), int(bullet.y))),
-            bullet.radius
-        )
+        hud.draw(screen)
 
-        for slime in slimes[:]:
-            slime_rect = pygame.Rect(slime.x, slime.y, slime.width, slime.height)
-            if bullet_rect.colliderect(slime_rect):
-                slime.health.take_damage(bullet.damage)
-                if slime.health.current_hearts <= 0:
-                    slimes.remove(slime)
-                    killed_slimes += 1
-                try:
-                    bullets.remove(bullet)
-                except ValueError:
-                    pass
-                break
+        if game_over:
+            box_width = 400
+            box_height = 200
+            x = WIDTH // 2 - box_width // 2
+            y = HEIGHT // 2 - box_height // 2
 
-        if bullet.x < 0 or bullet.x > MAP_SIZE[0] or bullet.y < 0 or bullet.y > MAP_SIZE[1]:
-            bullets.remove(bullet)
+            minutes = survived // 60000
+            seconds = (survived % 60000) // 1000
+            time_str = f"{minutes}:{seconds:02d}"
 
-    if not game_over:
-        for slime in slimes:
-            slime.move(player.x, player.y)
-            slime.draw(screen, camera)
+            lines = [
+                "Game Over! Player has died.",
+                f"Time Survived: {time_str}",
+                f"Slimes Killed: {killed_slimes}"
+            ]
 
-        for slime in slimes:
-            slime_rect = pygame.Rect(slime.x, slime.y, slime.width, slime.height)
-            player_rect = pygame.Rect(player.x, player.y, player.width, player.height)
-            if slime_rect.colliderect(player_rect):
+            hud.draw_overlay(screen)
+            dirty_rects.invalidate()
+
+            draw_message_box(screen, lines, x, y, box_width, box_height)
+
+        profiler.draw(screen)
+        profiler.lap("hud")
+        dirty_rects.present(camera)
+        profiler.lap("flip")
+        profiler.end(len(slimes), bullets.count, len(items_on_ground))
+
+        if frame_times is not None:
+            frame_times.append(time.perf_counter_ns() - frame_start)
+
+    timers.cancel(animation)
+    timers.cancel(ending)
+    return frame_times
+
+MESSAGE_HEADER = struct.Struct("<BI")
+WELCOME_MESSAGE = struct.Struct("<IQI")
+INPUT_MESSAGE = struct.Struct("<IBBb")
+SNAPSHOT_HEADER = struct.Struct("<IIIddhhbI")
+BULLET_RECORD = struct.Struct("<iiB")
+DELTA_COUNT = struct.Struct("<HH")
+ENTITY_KEY = struct.Struct("<IB")
+MSG_WELCOME, MSG_INPUT, MSG_SNAPSHOT = 1, 2, 3
+ACTION_PICKUP, ACTION_DROP, ACTION_RELOAD = 1, 2, 4
+FIRE_HELD = 1 << len(RECORDED_KEYS)
+# players and slimes are x, y, direction, animation frame and hearts; items are x, y and weapon index
+ENTITY_FIELDS = ("iiBBB", "iiBBB", "iiB")
+EMPTY_STATE = ({}, {}, {})
+delta_structs = {}
+
+def send_message(writer, kind, payload):
+    writer.write(MESSAGE_HEADER.pack(kind, len(payload)) + payload)
+
+async def read_message(reader):
+    kind, length = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+def delta_struct(fields, mask):
+    packed = delta_structs.get((fields, mask))
+    if packed is None:
+        packed = delta_structs[(fields, mask)] = struct.Struct(
+            "<" + "".join(code for i, code in enumerate(fields) if mask >> i & 1))
+    return packed
+
+def encode_delta(state, baseline):
+    parts = []
+    for fields, entities, previous in zip(ENTITY_FIELDS, state, baseline):
+        removed = [key for key in previous if key not in entities]
+        changed = []
+        for key, values in entities.items():
+            old = previous.get(key)
+            if old == values:
+                continue
+            # only the fields that differ from what the client already has go on the wire
+            mask = sum(1 << i for i, value in enumerate(values) if old is None or old[i] != value)
+            changed.append(ENTITY_KEY.pack(key, mask)
+                           + delta_struct(fields, mask).pack(*(value for i, value in enumerate(values) if mask >> i & 1)))
+        parts.append(DELTA_COUNT.pack(len(removed), len(changed)))
+        parts.append(struct.pack(f"<{len(removed)}I", *removed))
+        parts += changed
+    return b"".join(parts)
+
+def decode_delta(data, offset, baseline):
+    state = []
+    for fields, previous in zip(ENTITY_FIELDS, baseline):
+        removed, changed = DELTA_COUNT.unpack_from(data, offset)
+        offset += DELTA_COUNT.size
+        entities = dict(previous)
+        for key in struct.unpack_from(f"<{removed}I", data, offset):
+            del entities[key]
+        offset += 4 * removed
+        for _ in range(changed):
+            key, mask = ENTITY_KEY.unpack_from(data, offset)
+            offset += ENTITY_KEY.size
+            packed = delta_struct(fields, mask)
+            values = iter(packed.unpack_from(data, offset))
+            offset += packed.size
+            old = entities.get(key)
+            entities[key] = tuple(next(values) if mask >> i & 1 else old[i] for i in range(len(fields)))
+        state.append(entities)
+    return state, offset
+
+def slot_state(slot):
+    if isinstance(slot, Weapon):
+        return weapon_index(slot), slot.current_ammo
+    # anything else a player can carry is ammo
+    return NO_WEAPON, int(slot is not None)
+
+def item_kind(item):
+    return weapon_index(item.original) if isinstance(item.original, Weapon) else NO_WEAPON
+
+class RemotePlayer:
+    def __init__(self, client_id, writer):
+        self.id = client_id
+        self.writer = writer
+        self.player = Player()
+        self.inventory = Inventory()
+        self.inventory.add_item(Weapon(WEAPONS['pistol'], textures['pistol']))
+        self.inventory.add_item(Weapon(WEAPONS['ak47'], textures['ak47']))
+        self.flow = FlowField(flow_field.radius)
+        self.keys = KeyState()
+        self.firing = False
+        self.actions = 0
+        self.direction = "down"
+        self.frame = 0
+        self.moving = False
+        self.sequence = 0
+        self.acked = 0
+        self.sent = OrderedDict()
+        self.snapshots = 0
+        self.bytes_sent = 0
+
+    def center(self):
+        return self.player.x + self.player.width / 2, self.player.y + self.player.height / 2
+
+    def view(self):
+        x, y = self.center()
+        return pygame.Rect(x - WIDTH // 2 - LOD_MARGIN, y - HEIGHT // 2 - LOD_MARGIN,
+                           WIDTH + 2 * LOD_MARGIN, HEIGHT + 2 * LOD_MARGIN)
+
+    def state(self):
+        player = self.player
+        return (int(player.x), int(player.y), BatchedSlimes.DIRECTIONS.index(self.direction), self.frame,
+                player.health.current_hearts)
+
+class GameServer:
+    def __init__(self, seed):
+        reset(seed, simulated_clock=True, threaded_world=True)
+        # players join over the network, the local one only exists for the single-player loop
+        roster.clear()
+        self.remotes = {}
+        self.next_id = 1
+        self.animation = timers.schedule(ms_to_ticks(150), self.animate)
+
+    def animate(self):
+        for remote in self.remotes.values():
+            if remote.moving:
+                remote.frame = (remote.frame + 1) % 4
+        self.animation = timers.schedule(ms_to_ticks(150), self.animate)
+
+    async def connect(self, reader, writer):
+        remote = RemotePlayer(self.next_id, writer)
+        self.next_id += 1
+        self.remotes[remote.id] = remote
+        roster.append(remote.player)
+        world_map.flows.append(remote.flow)
+        send_message(writer, MSG_WELCOME, WELCOME_MESSAGE.pack(remote.id, world_map.seed % 2 ** 64, TICK_RATE))
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind != MSG_INPUT:
+                    continue
+                acked, held, actions, selected = INPUT_MESSAGE.unpack(payload)
+                remote.acked = max(remote.acked, acked)
+                remote.keys = KeyState(key for bit, key in enumerate(RECORDED_KEYS) if held >> bit & 1)
+                remote.firing = bool(held & FIRE_HELD)
+                remote.actions |= actions
+                if -1 <= selected < len(remote.inventory.slots):
+                    remote.inventory.selected = selected
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.remotes[remote.id]
+            roster.remove(remote.player)
+            world_map.flows.remove(remote.flow)
+            writer.close()
+
+    def chase(self, remote, members):
+        # every player keeps its own flow field, and the slimes around them follow that one
+        remote.flow.update(*remote.center())
+        slimes.step(remote.player.x, remote.player.y, flow=remote.flow, members=members)
+
+    def step(self):
+        global killed_slimes
+
+        game_clock.advance()
+        remotes = list(self.remotes.values())
+        for remote in remotes:
+            remote.player.prev_x, remote.player.prev_y = remote.player.x, remote.player.y
+        timers.advance(game_clock.ticks)
+
+        alive = [remote for remote in remotes if remote.player.health.current_hearts > 0]
+        for remote in alive:
+            player, inventory = remote.player, remote.inventory
+            if remote.actions & ACTION_RELOAD:
+                reload(inventory)
+            if remote.actions & ACTION_PICKUP:
+                pick_up(player, inventory)
+            if remote.actions & ACTION_DROP:
+                drop_item(player, inventory)
+            remote.direction, remote.moving = walk(player, remote.keys, remote.direction)
+            if remote.firing:
+                fire(player, inventory, remote.direction)
+        for remote in remotes:
+            remote.actions = 0
+        if remotes:
+            world_map.follow([remote.center() for remote in remotes])
+
+        killed_slimes += bullets.step(slimes, world_map.bounds())
+
+        # each slime chases whichever living player is closest to it
+        if alive and len(slimes):
+            for remote, members in zip(alive, slimes.nearest([(r.player.x, r.player.y) for r in alive])):
+                self.chase(remote, members)
+        for remote in alive:
+            player = remote.player
+            if slimes.touching(pygame.Rect(player.x, player.y, player.width, player.height)):
                 player.health.take_damage(1)
 
-    if not game_over:
-        now = pygame.time.get_ticks()
-        if is_moving and now - last_update > animation_speed * 1000:
-            current_frame = (current_frame + 1) % 4
-            last_update = now
-        screen.blit(player_frames[current_direction][current_frame], camera.apply((player.x, player.y)))
-
-    inventory.draw(screen)
-    for i in range(player.health.current_hearts):
-        screen.blit(textures['heart'], (10 + i * 35, 10))
-
-    if player.health.current_hearts <= 0 and not game_over:
-        game_over = True
-        game_over_time = pygame.time.get_ticks()
+    def snapshot(self, remote):
+        view = remote.view()
+        players = {other.id: other.state() for other in self.remotes.values()
+                   if view.colliderect((other.player.x, other.player.y, other.player.width, other.player.height))}
+        state = [players, dict(slimes.visible(view)),
+                 {item.net_id: (int(item.x), int(item.y), item_kind(item)) for item in items_on_ground.query(view)}]
+
+        # delta against the newest state the client has acknowledged, or from nothing if that fell out of history
+        baseline = remote.sent.get(remote.acked)
+        base_sequence = remote.acked if baseline is not None else 0
+        remote.sequence += 1
+        remote.sent[remote.sequence] = state
+        while len(remote.sent) > SNAPSHOT_HISTORY:
+            remote.sent.popitem(last=False)
+
+        player, inventory = remote.player, remote.inventory
+        parts = [SNAPSHOT_HEADER.pack(remote.sequence, base_sequence, game_clock.ticks, player.x, player.y,
+                                      player.health.current_hearts, player.health.max_hearts, inventory.selected,
+                                      killed_slimes)]
+        parts += [SLOT_RECORD.pack(*slot_state(slot)) for slot in inventory.slots]
+        parts.append(encode_delta(state, baseline or EMPTY_STATE))
+        shots = bullets.visible(view)
+        parts.append(COUNT.pack(len(shots)))
+        parts += [BULLET_RECORD.pack(x, y, config_index(config)) for x, y, config in shots]
+        return b"".join(parts)
+
+    def broadcast(self):
+        for remote in self.remotes.values():
+            # a client that cannot keep up skips snapshots instead of queueing them; the next
+            # one is still a delta against whatever it acknowledged last
+            if remote.writer.is_closing() or remote.writer.transport.get_write_buffer_size() > SNAPSHOT_BACKLOG:
+                continue
+            payload = self.snapshot(remote)
+            send_message(remote.writer, MSG_SNAPSHOT, payload)
+            remote.snapshots += 1
+            remote.bytes_sent += MESSAGE_HEADER.size + len(payload)
+
+    def report(self):
+        seconds = max(1, game_clock.ticks) / TICK_RATE
+        return [f"client {remote.id}: {remote.snapshots} snapshots, "
+                f"{remote.bytes_sent / max(1, remote.snapshots):.0f} B/snapshot, {remote.bytes_sent / seconds / 1024:.1f} KiB/s"
+                for remote in self.remotes.values()]
+
+    async def serve(self, host, port, ticks=None, bots=0):
+        server = await asyncio.start_server(self.connect, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"serving world {world_map.seed} on {host}:{port}")
+        clients = [asyncio.create_task(run_bot(host, port, seed)) for seed in range(bots)]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        tick = 0
+        try:
+            while ticks is None or tick < ticks:
+                self.step()
+                self.broadcast()
+                tick += 1
+                deadline += 1 / TICK_RATE
+                # like the local clock, drop time the loop cannot catch up on instead of spiralling
+                if loop.time() - deadline > MAX_CATCHUP_STEPS / TICK_RATE:
+                    deadline = loop.time()
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+            return self.report()
+        finally:
+            server.close()
+            timers.cancel(self.animation)
+            for remote in list(self.remotes.values()):
+                remote.writer.close()
+            for client in clients:
+                client.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+
+class NetClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.id = None
+        self.seed = None
+        self.header = None
+        self.slots = []
+        self.state = EMPTY_STATE
+        self.states = OrderedDict()
+        self.bullets = []
+        self.acked = 0
+        self.bytes_received = 0
+
+    async def welcome(self):
+        kind, payload = await read_message(self.reader)
+        if kind != MSG_WELCOME:
+            raise ConnectionError("server did not send a welcome")
+        self.id, self.seed, tick_rate = WELCOME_MESSAGE.unpack(payload)
+        if tick_rate != TICK_RATE:
+            raise ConnectionError(f"server ticks at {tick_rate} Hz, the game ticks at {TICK_RATE} Hz")
+
+    def receive(self, data):
+        header = SNAPSHOT_HEADER.unpack_from(data)
+        sequence, baseline = header[:2]
+        offset = SNAPSHOT_HEADER.size
+        slots = []
+        for _ in range(INVENTORY_SLOTS):
+            slots.append(SLOT_RECORD.unpack_from(data, offset))
+            offset += SLOT_RECORD.size
+        self.state, offset = decode_delta(data, offset, self.states[baseline] if baseline else EMPTY_STATE)
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        self.bullets = list(BULLET_RECORD.iter_unpack(data[offset:offset + count * BULLET_RECORD.size]))
+        self.header = header
+        self.slots = slots
+        self.states[sequence] = self.state
+        while len(self.states) > SNAPSHOT_HISTORY:
+            self.states.popitem(last=False)
+        self.acked = sequence
+
+    async def listen(self):
+        try:
+            while True:
+                kind, payload = await read_message(self.reader)
+                self.bytes_received += MESSAGE_HEADER.size + len(payload)
+                if kind == MSG_SNAPSHOT:
+                    self.receive(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def send_input(self, keys, firing, actions, selected):
+        held = sum(1 << bit for bit, key in enumerate(RECORDED_KEYS) if keys[key])
+        if firing:
+            held |= FIRE_HELD
+        send_message(self.writer, MSG_INPUT, INPUT_MESSAGE.pack(self.acked, held, actions, selected))
+
+async def run_bot(host, port, seed):
+    reader, writer = await asyncio.open_connection(host, port)
+    client = NetClient(reader, writer)
+    await client.welcome()
+    listener = asyncio.create_task(client.listen())
+    bot = random.Random(seed)
+    keys = KeyState()
+    firing = False
+    try:
+        while not listener.done():
+            actions = 0
+            if bot.random() < 0.05:
+                keys = KeyState([bot.choice(RECORDED_KEYS)])
+            if bot.random() < 0.01:
+                firing = not firing
+            if bot.random() < 0.01:
+                actions |= ACTION_RELOAD
+            if bot.random() < 0.005:
+                actions |= ACTION_PICKUP
+            client.send_input(keys, firing, actions, 1)
+            await asyncio.sleep(1 / TICK_RATE)
+    finally:
+        listener.cancel()
+        writer.close()
+    return client
+
+def draw_snapshot(client):
+    x, y, hearts, max_hearts, selected, killed = client.header[3:]
+    player.x = player.prev_x = x
+    player.y = player.prev_y = y
+    player.health.current_hearts, player.health.max_hearts = hearts, max_hearts
+    inventory.selected = selected
+    for i, (kind, ammo) in enumerate(client.slots):
+        slot = inventory.slots[i]
+        if kind != NO_WEAPON:
+            if not isinstance(slot, Weapon) or weapon_index(slot) != kind:
+                slot = inventory.slots[i] = make_weapon(kind, ammo)
+            slot.current_ammo = ammo
+        elif ammo:
+            if not isinstance(slot, AmmoItem):
+                inventory.slots[i] = AmmoItem(0, 0)
+        else:
+            inventory.slots[i] = None
 
-    if game_over:
+    camera.update(player)
+    world_map.update(camera.x + camera.width // 2, camera.y + camera.height // 2)
+    screen.fill((135, 206, 235))
+    ground.draw(render_queue, camera)
+
+    players, seen, items = client.state
+    names = list(WEAPONS)
+    configs = list(WEAPONS.values())
+    render_queue.extend(LAYER_ITEMS, [
+        (textures['ammo'] if kind == NO_WEAPON else textures[names[kind]], camera.apply((item_x, item_y)))
+        for item_x, item_y, kind in items.values()
+    ])
+    render_queue.extend(LAYER_BULLETS, [
+        (bullets.sprite(configs[kind]), camera.apply((bullet_x - configs[kind].bullet_size, bullet_y - configs[kind].bullet_size)))
+        for bullet_x, bullet_y, kind in client.bullets
+    ])
+    render_queue.extend(LAYER_SLIMES, [
+        (Slime.sprite(BatchedSlimes.DIRECTIONS[direction], frame, slime_hearts),
+         camera.apply((slime_x - Slime.SPRITE_OFFSET[0], slime_y - Slime.SPRITE_OFFSET[1])))
+        for slime_x, slime_y, direction, frame, slime_hearts in seen.values()
+    ])
+    render_queue.extend(LAYER_PLAYER, [
+        (player_frames[BatchedSlimes.DIRECTIONS[direction]][frame], camera.apply((other_x, other_y)))
+        for other_x, other_y, direction, frame, other_hearts in players.values() if other_hearts > 0
+    ])
+    render_queue.flush(screen)
+    hud.draw(screen)
+
+    if hearts <= 0:
         box_width = 400
         box_height = 200
-        x = WIDTH // 2 - box_width // 2
-        y = HEIGHT // 2 - box_height // 2
-
-        elapsed_time = pygame.time.get_ticks() - start_time
-        minutes = elapsed_time // 60000
-        seconds = (elapsed_time % 60000) // 1000
-        time_str = f"{minutes}:{seconds:02d}"
-
-        lines = [
-            "Game Over! Player has died.",
-            f"Time Survived: {time_str}",
-            f"Slimes Killed: {killed_slimes}"
-        ]
-
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))
-        screen.blit(overlay, (0, 0))
-
-        draw_message_box(screen, lines, x, y, box_width, box_height)
-
-    if current_time == 5000:
-        SPAWN_INTERVAL -= 500
-    if current_time == 20000:
-        SPAWN_INTERVAL -= 500
-        DAMAGE_INTERVAL -= 100
-    if current_time == 30000:
-        SPAWN_INTERVAL -= 500
-        DAMAGE_INTERVAL -= 300
-    if current_time == 60000:
-        SPAWN_INTERVAL -= 450
-        DAMAGE_INTERVAL -= 400
-
-    pygame.display.flip()
-
-    if game_over:
-        while pygame.time.get_ticks() - game_over_time < 5000:
-            for event in pygame.event.get():
+        hud.draw_overlay(screen)
+        dirty_rects.invalidate()
+        draw_message_box(screen, ["Game Over! Player has died.", f"Slimes Killed: {killed}"],
+                         WIDTH // 2 - box_width // 2, HEIGHT // 2 - box_height // 2, box_width, box_height)
+    dirty_rects.present(camera)
+
+async def play(host, port, frames=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    client = NetClient(reader, writer)
+    await client.welcome()
+    # terrain and decorations are generated from the seed on both ends; everything that moves comes from the server
+    reset(client.seed)
+    listener = asyncio.create_task(client.listen())
+    input_driver = LiveInput()
+    running = True
+    frame_index = 0
+    firing = False
+    selected = -1
+    try:
+        while running and not listener.done() and (frames is None or frame_index < frames):
+            frame_index += 1
+            actions = 0
+            for event in input_driver.events():
                 if event.type == pygame.QUIT:
                     running = False
-                    pygame.quit()
-                    exit()
-            pygame.time.wait(1000)
-        running = False
-
-pygame.quit()
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    slot = inventory_slot_at(event.pos)
+                    if slot is not None:
+                        selected = slot
+                    if event.button == 1:
+                        firing = True
+                    if event.button == 3:
+                        actions |= ACTION_RELOAD
+                if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                    firing = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_f:
+                        actions |= ACTION_PICKUP
+                    if event.key == pygame.K_q:
+                        actions |= ACTION_DROP
+            client.send_input(input_driver.pressed(), firing, actions, selected)
+            if client.header is not None:
+                draw_snapshot(client)
+            await asyncio.sleep(1 / RENDER_FPS if RENDER_FPS else 0)
+    finally:
+        listener.cancel()
+        writer.close()
+    return client
+
+def address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def main(argv=None):
+    global BATCHED_SLIMES, SLIME_WORKERS, SLIME_LOD, DIRTY_RECTS, RENDER_FPS, PROFILE_CSV, SAVE_PATH
+
+    parser = argparse.ArgumentParser(description="Top-down slime shooter")
+    parser.add_argument("--headless", action="store_true",
+                        help="run on the SDL dummy video driver with a simulated clock")
+    parser.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    parser.add_argument("--seed", type=int, default=None, help="seed for world generation, spawns and spread")
+    parser.add_argument("--input", choices=["idle", "random"], default="random",
+                        help="input driver used in headless mode")
+    parser.add_argument("--batched", action="store_true", help="simulate slimes with the NumPy engine")
+    parser.add_argument("--workers", type=int, default=SLIME_WORKERS,
+                        help="split slime AI by chunk across this many worker processes (needs NumPy)")
+    parser.add_argument("--no-lod", action="store_true",
+                        help="update every slime on every tick instead of throttling off-screen and distant ones")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="upload only changed screen areas while the camera is still")
+    parser.add_argument("--fps", type=int, default=RENDER_FPS,
+                        help=f"render frame cap, 0 for uncapped (simulation always runs at {TICK_RATE} Hz)")
+    parser.add_argument("--profile-csv", metavar="PATH",
+                        help="write per-frame phase timings and entity counts to a CSV file (F3 toggles the overlay)")
+    parser.add_argument("--save", metavar="DIR",
+                        help="resume from this save directory if it exists; F5 and quitting save back to it")
+    parser.add_argument("--record", metavar="PATH", help="record the seed and per-frame input to a replay file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="play back a recording; combine with --headless and --fps 0 to time it")
+    parser.add_argument("--serve", metavar="HOST:PORT", type=address,
+                        help="run a headless shared world for networked players, port 0 picks a free one "
+                             "(--frames limits the ticks)")
+    parser.add_argument("--connect", metavar="HOST:PORT", type=address,
+                        help="join a server and render the world it sends")
+    parser.add_argument("--bots", type=int, default=0, help="connect this many random-input bot clients to --serve")
+    args = parser.parse_args(argv)
+    if (args.record or args.replay) and args.save:
+        parser.error("--record and --replay start from a fresh world and cannot be combined with --save")
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if (args.serve or args.connect) and (args.save or args.record or args.replay):
+        parser.error("--serve and --connect cannot be combined with --save, --record or --replay")
+    if args.serve and args.connect:
+        parser.error("--serve and --connect are mutually exclusive")
+    if (args.serve or args.connect) and args.workers:
+        # workers split the world around a single player, a shared world streams around all of them
+        parser.error("--workers cannot be combined with --serve or --connect")
+    if args.bots and not args.serve:
+        parser.error("--bots needs --serve")
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        # saves, the welcome message and NumPy's seed sequences all take the seed as an unsigned 64-bit word
+        parser.error("--seed must be between 0 and 2**64 - 1")
+
+    BATCHED_SLIMES = BATCHED_SLIMES or args.batched
+    SLIME_WORKERS = args.workers
+    SLIME_LOD = SLIME_LOD and not args.no_lod
+    DIRTY_RECTS = DIRTY_RECTS or args.dirty_rects
+    RENDER_FPS = args.fps
+    PROFILE_CSV = args.profile_csv
+    SAVE_PATH = args.save
+    if args.serve or args.connect:
+        if args.serve:
+            server = GameServer(args.seed if args.seed is not None else random.getrandbits(32))
+            for line in asyncio.run(server.serve(*args.serve, ticks=args.frames, bots=args.bots)):
+                print(line)
+        else:
+            asyncio.run(play(*args.connect, frames=args.frames))
+        world_map.close()
+        slimes.close()
+        profiler.close()
+        pygame.quit()
+        return
+    store = SaveStore(SAVE_PATH) if SAVE_PATH else None
+    input_driver = None
+    frames = args.frames
+    if args.replay:
+        recording = load_recording(args.replay)
+        input_driver = start_replay(recording, simulated_clock=args.headless)
+        frames = len(recording["steps"]) if frames is None else min(frames, len(recording["steps"]))
+    elif store is not None and store.exists():
+        load_game(store, simulated_clock=args.headless)
+    else:
+        seed = args.seed
+        if args.record and seed is None:
+            seed = random.getrandbits(32)
+        # a recording has to see chunks arrive on the same ticks when it is replayed, so generate them inline
+        reset(seed, simulated_clock=args.headless, store=store, threaded_world=False if args.record else None)
+        if args.headless:
+            input_driver = RandomInput(seed) if args.input == "random" else ScriptedInput({})
+        if args.record:
+            input_driver = RecordingInput(input_driver or LiveInput(), seed)
+    frame_times = run(frames, input_driver, [] if args.headless or args.replay else None)
+    if args.record:
+        input_driver.save(args.record)
+    if frame_times:
+        print(f"{len(frame_times)} frames, {sum(frame_times) / len(frame_times) / 1e6:.3f} ms/frame")
+    if store is not None and player.health.current_hearts > 0:
+        save_game(store)
+    world_map.close()
+    slimes.close()
+    profiler.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
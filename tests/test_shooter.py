@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pygame
+import pytest
+
+import shooter
+
+needs_numpy = pytest.mark.skipif(shooter.np is None, reason="needs NumPy")
+
+@pytest.fixture(autouse=True)
+def game(monkeypatch):
+    # assets load relative to the repository, and every test starts from a fresh single-player world
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(shooter, "BATCHED_SLIMES", False)
+    monkeypatch.setattr(shooter, "SLIME_WORKERS", 0)
+    monkeypatch.setattr(shooter, "MAX_SLIMES", shooter.MAX_SLIMES)
+    yield
+    shooter.slimes.close()
+    shooter.world_map.close()
+
+def test_wall_edit_invalidates_ground_chunk():
+    shooter.reset(3, simulated_clock=True, threaded_world=False)
+    chunk_x = int(shooter.player.x // shooter.CHUNK_SIZE)
+    chunk_y = int(shooter.player.y // shooter.CHUNK_SIZE)
+    neighbour = (chunk_x + 1, chunk_y)
+    cached = shooter.ground.get(chunk_x, chunk_y)
+    shooter.ground.get(*neighbour)
+    assert shooter.ground.get(chunk_x, chunk_y) is cached
+
+    cell_x = chunk_x * shooter.CHUNK_CELLS
+    cell_y = chunk_y * shooter.CHUNK_CELLS
+    shooter.world_map.chunks[(chunk_x, chunk_y)].decorations.pop((cell_x * shooter.CELL_SIZE, cell_y * shooter.CELL_SIZE), None)
+    wall = 1 - shooter.world_map.cell(cell_x, cell_y)
+    shooter.world_map.set(cell_x, cell_y, wall)
+    assert (chunk_x, chunk_y) not in shooter.ground.chunks
+    assert neighbour in shooter.ground.chunks
+
+    redrawn = shooter.ground.get(chunk_x, chunk_y)
+    assert redrawn is not cached
+    texture = shooter.textures['grass2' if wall else 'grass1']
+    corner = redrawn.subsurface(texture.get_rect())
+    assert pygame.image.tobytes(corner, "RGB") == pygame.image.tobytes(texture, "RGB")
+
+def chase(batched):
+    shooter.BATCHED_SLIMES = batched
+    shooter.MAX_SLIMES = 0
+    shooter.reset(7, simulated_clock=True)
+    shooter.player.health.invulnerable = True
+    placement = random.Random(7)
+    # everything spawns inside the detection radius, so no slime wanders off on its engine's own random stream
+    for _ in range(60):
+        shooter.slimes.spawn(shooter.player.x + placement.uniform(-1200, 1200),
+                             shooter.player.y + placement.uniform(-1200, 1200))
+    shooter.run(300, shooter.ScriptedInput({}), [])
+    return [(round(x, 6), round(y, 6), hearts) for x, y, hearts, direction in shooter.slimes.records()]
+
+@needs_numpy
+def test_batched_engine_matches_objects():
+    objects = chase(False)
+    assert isinstance(shooter.slimes, shooter.SlimeSwarm)
+    batched = chase(True)
+    assert isinstance(shooter.slimes, shooter.BatchedSlimes)
+    assert batched == objects
+
+def wall_zone(x, y, width, height):
+    # the original rule: a box hits a wall cell only if it reaches into the top 30% of it
+    x = int(x)
+    y = int(y)
+    for cell_y in range(y // shooter.CELL_SIZE, (y + height) // shooter.CELL_SIZE + 1):
+        for cell_x in range(x // shooter.CELL_SIZE, (x + width) // shooter.CELL_SIZE + 1):
+            grid_y = cell_y * shooter.CELL_SIZE
+            if shooter.world_map.cell(cell_x, cell_y) == 1:
+                if y + height > grid_y and y < grid_y + shooter.CELL_SIZE * 0.3:
+                    return True
+    return False
+
+def test_wall_queries_keep_the_wall_zone_rule():
+    shooter.reset(5, simulated_clock=True, threaded_world=False)
+    placement = random.Random(5)
+    boxes = []
+    for _ in range(2000):
+        width, height = placement.choice([(60, 80), (30, 30), (4, 4), (100, 100), (0, 0)])
+        boxes.append((shooter.player.x + placement.uniform(-1500, 1500),
+                      shooter.player.y + placement.uniform(-1500, 1500), width, height))
+    expected = [wall_zone(*box) for box in boxes]
+    assert any(expected) and not all(expected)
+    assert [shooter.world_map.is_wall(*box) for box in boxes] == expected
+    if shooter.np is not None:
+        for size in {(width, height) for x, y, width, height in boxes}:
+            same = [box for box in boxes if box[2:] == size]
+            hits = shooter.world_map.is_wall_batch(shooter.np.array([box[0] for box in same]),
+                                                   shooter.np.array([box[1] for box in same]), *size)
+            assert hits.tolist() == [wall_zone(*box) for box in same]
+
+def test_far_chunks_are_evicted_and_edits_survive():
+    shooter.reset(2, simulated_clock=True, threaded_world=False)
+    world = shooter.world_map
+    key = next(key for key in sorted(world.active) if world.chunk_items(world.chunks[key]))
+    home = world.chunk_items(world.chunks[key])
+    taken = home[0]
+    shooter.items_on_ground.remove(taken)
+    world.touch(taken.x, taken.y)
+    world.set(key[0] * shooter.CHUNK_CELLS + 3, key[1] * shooter.CHUNK_CELLS + 3, 1)
+
+    limit = (2 * shooter.EVICT_RADIUS + 1) ** 2
+    for row in range(10):
+        for col in range(60):
+            world.update(col * shooter.CHUNK_SIZE + 500, row * shooter.CHUNK_SIZE + 500)
+            assert len(world.chunks) <= limit
+    assert key not in world.chunks and key in world.stored
+
+    world.update(key[0] * shooter.CHUNK_SIZE + 500, key[1] * shooter.CHUNK_SIZE + 500)
+    assert world.cell(key[0] * shooter.CHUNK_CELLS + 3, key[1] * shooter.CHUNK_CELLS + 3) == 1
+    back = world.chunk_items(world.chunks[key])
+    assert sorted((item.x, item.y) for item in back) == sorted((item.x, item.y) for item in home[1:])
+
+def test_slime_walks_around_a_wall():
+    shooter.MAX_SLIMES = 0
+    shooter.reset(1, simulated_clock=True)
+    player = shooter.player
+    player.health.invulnerable = True
+    cell_x = int(player.x + player.width / 2) // shooter.CELL_SIZE
+    cell_y = int(player.y + player.height / 2) // shooter.CELL_SIZE
+    for y in range(cell_y - 12, cell_y + 13):
+        for x in range(cell_x - 20, cell_x + 12):
+            shooter.world_map.set(x, y, 0)
+    # a wall column between the slimes and the player, open only below its bottom end
+    for y in range(cell_y - 10, cell_y + 10):
+        shooter.world_map.set(cell_x - 5, y, 1)
+    for row in range(10):
+        shooter.slimes.spawn((cell_x - 12) * shooter.CELL_SIZE + 20, (cell_y - 8 + row) * shooter.CELL_SIZE + 10)
+    shooter.run(1500, shooter.ScriptedInput({}), [])
+    distances = [((x - player.x) ** 2 + (y - player.y) ** 2) ** 0.5 for x, y, hearts, direction in shooter.slimes.records()]
+    assert min(distances) < shooter.CELL_SIZE
+
+@needs_numpy
+@pytest.mark.parametrize("seed", [0, 7, 2 ** 63, 2 ** 64 - 1, -5])
+def test_batch_generator_matches_pure_python(seed):
+    for chunk_x, chunk_y in [(0, 0), (-1, -1), (-40, 13), (5, -9), (123456, -987654)]:
+        walls, contents = shooter.roll_chunk(seed, chunk_x, chunk_y)
+        assert (bytes(walls), contents) == shooter.roll_chunk_batch(seed, chunk_x, chunk_y)
+
+def state():
+    return (shooter.game_clock.ticks, shooter.player.x, shooter.player.y, shooter.player.health.current_hearts,
+            shooter.killed_slimes, shooter.inventory.selected,
+            [shooter.slot_state(slot) if slot is not None else None for slot in shooter.inventory.slots],
+            sorted((round(x, 6), round(y, 6), hearts, direction) for x, y, hearts, direction in shooter.slimes.records()))
+
+def test_save_load_round_trip(tmp_path):
+    store = shooter.SaveStore(str(tmp_path / "save"))
+    shooter.reset(3, simulated_clock=True, store=store)
+    for offset in range(5):
+        shooter.slimes.spawn(shooter.player.x + 300 + offset * 70, shooter.player.y)
+    shooter.run(120, shooter.RandomInput(5), [])
+    shooter.world_map.set(200, 50, 1)
+    shooter.inventory.slots[0].current_ammo = 3
+    shooter.save_game(store)
+    saved = state()
+
+    shooter.load_game(shooter.SaveStore(str(tmp_path / "save")))
+    assert state() == saved
+    assert shooter.world_map.require(20, 5).walls.get(0, 0) == 1
+
+def test_save_keeps_a_seed_past_the_signed_range(tmp_path):
+    seed = 2 ** 64 - 1
+    store = shooter.SaveStore(str(tmp_path / "save"))
+    shooter.reset(seed, simulated_clock=True, store=store)
+    shooter.save_game(store)
+    loaded = shooter.SaveStore(str(tmp_path / "save"))
+    shooter.load_game(loaded)
+    assert loaded.seed == shooter.world_map.seed == seed
+
+def test_chunk_file_is_compacted(tmp_path):
+    path = tmp_path / "save"
+    store = shooter.SaveStore(str(path))
+    shooter.reset(3, simulated_clock=True, store=store)
+    cell_x = int(shooter.player.x // shooter.CELL_SIZE)
+    cell_y = int(shooter.player.y // shooter.CELL_SIZE)
+    sizes = []
+    for wall in range(20):
+        shooter.world_map.set(cell_x + 2, cell_y + 2, wall % 2)
+        shooter.save_game(store)
+        sizes.append(os.path.getsize(path / "chunks.bin"))
+    live = sum(length for offset, length in store.index.values())
+    # every save appends a record, and superseded ones are dropped once they outweigh the live ones
+    assert max(sizes) <= shooter.CHUNK_FILE_HEADER.size + 2 * live
+    assert any(later < earlier for earlier, later in zip(sizes, sizes[1:]))
+
+    shooter.load_game(shooter.SaveStore(str(path)))
+    assert shooter.world_map.cell(cell_x + 2, cell_y + 2) == 1
+
+def test_replay_reproduces_recording(tmp_path):
+    shooter.reset(11, simulated_clock=True, threaded_world=False)
+    recorder = shooter.RecordingInput(shooter.RandomInput(4), 11)
+    shooter.run(300, recorder, [])
+    recorded = state()
+    recorder.save(str(tmp_path / "run.json"))
+
+    recording = shooter.load_recording(str(tmp_path / "run.json"))
+    shooter.run(len(recording["steps"]), shooter.start_replay(recording, simulated_clock=True), [])
+    assert state() == recorded
+
+def test_difficulty_steps_fire_on_schedule():
+    shooter.MAX_SLIMES = 0
+    shooter.reset(4, simulated_clock=True, threaded_world=False)
+    last = shooter.ms_to_ticks(shooter.DIFFICULTY_STEPS[-1][0])
+    for tick in range(1, last):
+        shooter.timers.advance(tick)
+    assert shooter.SPAWN_INTERVAL == 500
+    shooter.timers.advance(last)
+    assert shooter.SPAWN_INTERVAL == 50
+    assert shooter.DAMAGE_INTERVAL == shooter.BASE_DAMAGE_INTERVAL - 800
+
+def test_game_over_ends_the_run_without_blocking():
+    shooter.MAX_SLIMES = 0
+    shooter.reset(4, simulated_clock=True, threaded_world=False)
+    shooter.player.health.current_hearts = 0
+    started = time.perf_counter()
+    frame_times = shooter.run(100000, shooter.ScriptedInput({}), [])
+    # the game-over box stays up for GAME_OVER_DELAY of game time while frames keep rendering
+    assert 1 < len(frame_times) < 100000
+    assert shooter.game_clock.get_ticks() >= shooter.GAME_OVER_DELAY
+    assert time.perf_counter() - started < shooter.GAME_OVER_DELAY / 1000
+
+def test_wall_windows_stay_per_player():
+    shooter.reset(5, simulated_clock=True, threaded_world=False)
+    world = shooter.world_map
+    far = (shooter.player.x + 30 * shooter.CHUNK_SIZE, shooter.player.y - 20 * shooter.CHUNK_SIZE)
+    world.follow([(shooter.player.x, shooter.player.y), far])
+    placement = random.Random(6)
+    boxes = [(anchor[0] + placement.uniform(-1500, 1500), anchor[1] + placement.uniform(-1500, 1500), 60, 80)
+             for anchor in [(shooter.player.x, shooter.player.y), far] for _ in range(500)]
+    expected = [wall_zone(*box) for box in boxes]
+    assert [world.is_wall(*box) for box in boxes] == expected
+    if shooter.np is not None:
+        hits = world.is_wall_batch(shooter.np.array([box[0] for box in boxes]),
+                                   shooter.np.array([box[1] for box in boxes]), 60, 80)
+        assert hits.tolist() == expected
+    size = (2 * shooter.EVICT_RADIUS + 1) * shooter.CHUNK_CELLS
+    assert len(world.windows) == 2
+    assert all(window.cols == window.rows == size for window in world.windows.values())
+
+def test_snapshot_delta_round_trip():
+    baseline = ({1: (10, 20, 0, 1, 3)}, {5: (100, 200, 2, 0, 3), 6: (300, 400, 1, 2, 2)}, {9: (50, 60, shooter.NO_WEAPON)})
+    current = ({1: (12, 20, 0, 2, 3), 2: (-40, 80, 3, 0, 3)}, {6: (300, 404, 1, 3, 1), 7: (0, -5, 0, 0, 3)},
+               {9: (50, 60, shooter.NO_WEAPON)})
+    for previous in (baseline, shooter.EMPTY_STATE):
+        data = shooter.encode_delta(current, previous)
+        decoded, offset = shooter.decode_delta(data, 0, previous)
+        assert decoded == list(current)
+        assert offset == len(data)
+    assert len(shooter.encode_delta(current, baseline)) < len(shooter.encode_delta(current, shooter.EMPTY_STATE))
+    unchanged = shooter.encode_delta(baseline, baseline)
+    assert shooter.decode_delta(unchanged, 0, baseline) == (list(baseline), len(unchanged))
+
+def test_server_streams_to_loopback_bots():
+    server = shooter.GameServer(9)
+    flow = shooter.flow_field
+    lines = asyncio.run(server.serve("127.0.0.1", 0, ticks=120, bots=2))
+    assert len(lines) == 2
+    assert all(int(line.split()[2]) > 0 for line in lines)
+    # each player's slimes follow that player's own field, the single-player one is left alone
+    assert shooter.flow_field is flow